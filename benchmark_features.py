@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Times the BLINC feature engineering engines on synthetic flows of the given sizes.
+The grouped engine is run on every flow; the per source address loop engine rescans
+the data once per source, so it is timed on the flows of a random sample of
+sources, with one scan of all flows per sampled source, and its runtime is
+extrapolated linearly to all sources. The approximate (HyperLogLog) engine is
+timed at the given relative error and its estimates are checked against the exact
+counts. With --workers the parallel engine is timed with 1, 2, 4, ... up to N
+processes.
+
+Usage: benchmark_features.py [#ofRows ...] [--error E] [--workers N]
+       (default 1000000 10000000 rows, error 0.01)
+'''
+
+import time
+import argparse
+import feature_engineering_function
+from synthetic_flows import synthetic_flows
+
+# number of source addresses timed with the loop engine
+LOOP_SAMPLE = 50
+
+parser = argparse.ArgumentParser(usage='benchmark_features.py [#ofRows ...] [--error E] [--workers N]')
+parser.add_argument('sizes', nargs='*', type=float, default=[1000000, 10000000])
+parser.add_argument('--error', type=float, default=0.01)
+parser.add_argument('--workers', type=int, default=None)
+args = parser.parse_args()
+error = args.error
+
+for nrows in map(int, args.sizes):
+    df = synthetic_flows(nrows)
+    nsources = df['srcaddr'].nunique()
+
+    start = time.perf_counter()
+    exact = feature_engineering_function.BLINC_features(df)
+    groupby_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    approx = feature_engineering_function.BLINC_features(df, error=error)
+    approx_time = time.perf_counter() - start
+    columns = feature_engineering_function.BLINC_COLUMNS
+    # one estimate per source address, each from its own sketch
+    sources = exact.drop_duplicates('srcaddr').index
+    relative = (approx.loc[sources, columns] - exact.loc[sources, columns]).abs() / exact.loc[sources, columns]
+
+    # time the loop engine on the flows of a random sample of sources, plus the
+    # scan of all flows it makes per source on the whole data, and scale up
+    sample = df['srcaddr'].drop_duplicates().sample(min(LOOP_SAMPLE, nsources), random_state=0)
+    sampled = df[df['srcaddr'].isin(sample)]
+    start = time.perf_counter()
+    feature_engineering_function._BLINC_features_loop(sampled)
+    for src in sample:
+        df[df['srcaddr'] == src]
+    loop_time = (time.perf_counter() - start) * nsources / len(sample)
+
+    print(f'{nrows} flows, {nsources} sources')
+    print(f'\tgroupby engine:\t\t{groupby_time:.2f}s')
+    print(f'\tloop engine (est.):\t{loop_time:.2f}s')
+    print(f'\tspeedup:\t\t{loop_time/groupby_time:.0f}x')
+    print(f'\tapproximate engine:\t{approx_time:.2f}s')
+    for column in columns:
+        # the root mean square relative error over sources should stay within the
+        # requested standard error (checked by tests/test_hyperloglog.py)
+        rms = (relative[column]**2).mean()**.5
+        print(f'\t{column} relative error:\trms {rms:.4f}, max {relative[column].max():.4f}'
+              + ('' if rms <= error else f'  EXCEEDS {error}'))
+
+    if args.workers:
+        workers = 1
+        while True:
+            start = time.perf_counter()
+            parallel = feature_engineering_function.BLINC_features_parallel(df, workers)
+            parallel_time = time.perf_counter() - start
+            assert parallel[columns].equals(exact[columns])
+            print(f'\tparallel engine, {workers} workers:\t{parallel_time:.2f}s'
+                  f' ({groupby_time/parallel_time:.1f}x groupby engine)')
+            if workers >= args.workers:
+                break
+            workers = min(workers * 2, args.workers)
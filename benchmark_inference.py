@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Load generator for inference_server.py. Starts the server for each given maximum
+batch size, replays flows to it from concurrent clients that each send requests
+of a fixed number of flows back to back, and reports the client side p50/p99
+request latency and the flow throughput, along with the batch sizes reported by
+the server's /metrics. Every batch size is run twice: once on flows carrying
+precomputed BLINC counts, which times the server alone, and once on raw flows
+counted by the server's --window. Without a model, a decision tree and scaler
+are trained on synthetic flows (synthetic_flows.py) for feature subset 7 and
+served instead.
+
+Usage: benchmark_inference.py [model.joblib scaler.pkl feature_subset_#] [--flows N] [--clients C]
+                              [--request-flows R] [--max-batch 1,64,512] [--max-wait MS] [--window SIZE]
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import pickle
+import argparse
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import pandas as pd
+from joblib import dump
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+import experiments
+import inference
+import feature_engineering_function
+from synthetic_flows import synthetic_flows
+
+parser = argparse.ArgumentParser(usage='benchmark_inference.py [model.joblib scaler.pkl feature_subset_#] [--flows N] [--clients C] [--request-flows R] [--max-batch 1,64,512] [--max-wait MS] [--window SIZE]')
+parser.add_argument('model', nargs='?')
+parser.add_argument('scaler', nargs='?')
+parser.add_argument('subset', nargs='?', default='7')
+parser.add_argument('--flows', type=int, default=20000,
+                    help='flows replayed per run')
+parser.add_argument('--clients', type=int, default=8,
+                    help='concurrent client connections')
+parser.add_argument('--request-flows', type=int, default=1,
+                    help='flows sent per request')
+parser.add_argument('--max-batch', default='1,64,512',
+                    help='comma separated server batch sizes to compare')
+parser.add_argument('--max-wait', type=float, default=2.,
+                    help='server batch wait in milliseconds')
+parser.add_argument('--window', default='300000',
+                    help='server BLINC count window of the raw flow runs')
+args = parser.parse_args()
+
+tmp = tempfile.mkdtemp()
+flows = synthetic_flows(args.flows, seed=1)
+if args.model is None:
+    # train a model on synthetic flows labelled with their app
+    train = feature_engineering_function.BLINC_features(synthetic_flows(args.flows, seed=0))
+    scaled = ['duration', 'dPkts', 'dOctets'] + feature_engineering_function.BLINC_COLUMNS
+    scaler = StandardScaler().fit(train[scaled])
+    features = experiments.COMBINATIONS[int(args.subset)][0]
+    X = pd.DataFrame(scaler.transform(train[scaled]), columns=scaled)[features]
+    args.model, args.scaler = os.path.join(tmp, 'model.joblib'), os.path.join(tmp, 'scaler.pkl')
+    dump(DecisionTreeClassifier(max_depth=12, random_state=0).fit(X, train['app']), args.model)
+    with open(args.scaler, 'wb') as f:
+        pickle.dump(scaler, f)
+
+
+def request_bodies(flows):
+    # request bodies of request_flows flows each, dealt round robin to the clients
+    records = flows.drop(columns='app').to_dict('records')
+    return [json.dumps(records[i:i + args.request_flows]).encode()
+            for i in range(0, len(records), args.request_flows)]
+
+
+def client(bodies, socket_path, latencies):
+    connection = inference.UnixHTTPConnection(socket_path)
+    for body in bodies:
+        start = time.perf_counter()
+        connection.request('POST', '/predict', body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f'server replied {response.status}')
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def run(max_batch, window, bodies):
+    # start a server, replay the bodies to it and report latency and throughput
+    socket_path = os.path.join(tmp, 'inference.sock')
+    command = [sys.executable, 'inference_server.py', args.model, args.scaler, args.subset,
+               '--socket', socket_path, '--max-batch', max_batch, '--max-wait', str(args.max_wait)]
+    if window is not None:
+        command += ['--window', window]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    server.stdout.readline()  # wait until the server listens
+
+    latencies = [[] for c in range(args.clients)]
+    threads = [threading.Thread(target=client, args=(bodies[c::args.clients], socket_path, latencies[c]))
+               for c in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    connection = inference.UnixHTTPConnection(socket_path)
+    connection.request('GET', '/metrics')
+    metrics = json.loads(connection.getresponse().read())
+    connection.close()
+    server.terminate()
+    server.wait()
+
+    p50, p99 = np.percentile(np.concatenate(latencies), [50, 99]) * 1000
+    print(f'max batch {max_batch:>5s}\twindow {window or "none":>8s}\t{len(flows) / elapsed:9.0f} flows/s'
+          f'\tp50 {p50:7.2f} ms\tp99 {p99:7.2f} ms\tmean batch {metrics["mean_batch_flows"]:6.1f} flows'
+          f'\tserver p99 {metrics["p99_ms"]:7.2f} ms')
+
+
+counted = request_bodies(feature_engineering_function.BLINC_features(flows))
+raw = request_bodies(flows)
+print(f'{len(flows)} flows, {len(raw)} requests of {args.request_flows} flows, {args.clients} clients')
+for max_batch in args.max_batch.split(','):
+    run(max_batch, None, counted)
+    run(max_batch, args.window, raw)
+
+shutil.rmtree(tmp)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Reports the memory held by a flow data set loaded with default pandas types and
+with the compact flow_schema.py types, per column and in total. Uses the given
+data file, or synthetic flows with engineered features of the given size.
+
+Usage: benchmark_schema.py [datafile | #ofRows=1000000]
+'''
+
+import sys
+import os
+import pandas as pd
+import flow_schema
+import storage
+import feature_engineering_function
+from synthetic_flows import synthetic_flows
+
+source = sys.argv[1] if len(sys.argv) > 1 else '1000000'
+if os.path.exists(source):
+    df = storage.read_table(source, schema=False)
+else:
+    df = feature_engineering_function.BLINC_features(synthetic_flows(int(float(source))))
+
+compact = flow_schema.apply_schema(df)
+
+report = pd.DataFrame({'default dtype': df.dtypes.astype(str),
+                       'default MB': df.memory_usage(deep=True, index=False) / 2**20,
+                       'compact dtype': compact.dtypes.astype(str),
+                       'compact MB': compact.memory_usage(deep=True, index=False) / 2**20})
+report.loc['total'] = ['', report['default MB'].sum(), '', report['compact MB'].sum()]
+report['reduction'] = report['default MB'] / report['compact MB']
+
+print(f'{len(df)} flows')
+print(report.round(2).to_string())
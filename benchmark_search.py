@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Compares the hyper-parameter searches of experiments.py (see experiments.SEARCHES)
+on the same parameter distributions: wall time of the search and best cross
+validation score for every algorithm. Uses the scaled train set and feature subset
+of the given data directory, or a synthetic classification problem with six
+features when no directory is given.
+
+Usage: benchmark_search.py [path/to/data/dir/ [feature_subset_#=7]] [--rows N] [--searches random,halving]
+'''
+
+import time
+import argparse
+import pandas as pd
+from sklearn.datasets import make_classification
+import experiments
+
+parser = argparse.ArgumentParser(usage='benchmark_search.py [path/to/data/dir/ [feature_subset_#=7]] [--rows N] [--searches random,halving]')
+parser.add_argument('data_path', nargs='?')
+parser.add_argument('subset', nargs='?', default='7')
+parser.add_argument('--rows', type=int, default=20000,
+                    help='rows of the synthetic problem')
+parser.add_argument('--searches', default=','.join(experiments.SEARCHES))
+args = parser.parse_args()
+
+if args.data_path:
+    features = experiments.feature_combos(args.subset)[0]
+    traindf, _ = experiments.load_data(args.data_path, 0, features + ['class'])
+    X, y = traindf[features], traindf['class']
+else:
+    X, y = make_classification(args.rows, n_features=6, n_informative=4, n_classes=5,
+                               n_clusters_per_class=2, random_state=0)
+    X = pd.DataFrame(X)
+print(f'{len(X)} rows, {X.shape[1]} features')
+
+for ml in experiments.ALGORITHMS:
+    for search in args.searches.split(','):
+        model_cv = experiments.make_search(ml, search, random_state=0)
+        start = time.perf_counter()
+        model_cv.fit(X, y)
+        elapsed = time.perf_counter() - start
+        print(f'{ml}\t{search:8s}\t{elapsed:8.2f}s\tbest score {model_cv.best_score_:.4f}\t{model_cv.best_params_}')
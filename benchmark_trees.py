@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Compares the per batch prediction latency of tree models saved by ML.py with
+their flat array export (flat_trees.py) at batch sizes from 1 to 100k flows,
+and checks that the exported models predict the same classes. Batches are drawn
+from a standard normal distribution, like the scaled features. Without models, a
+decision tree and a 63 tree random forest fitted on a synthetic classification
+problem with six features are compared instead.
+
+Usage: benchmark_trees.py [model.joblib ...] [--batches 1,10,100,1000,10000,100000] [--repeat R]
+'''
+
+import time
+import argparse
+import numpy as np
+from sklearn.datasets import make_classification
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.ensemble import RandomForestClassifier
+import experiments
+import flat_trees
+
+parser = argparse.ArgumentParser(usage='benchmark_trees.py [model.joblib ...] [--batches 1,10,100,1000,10000,100000] [--repeat R]')
+parser.add_argument('models', nargs='*')
+parser.add_argument('--batches', default='1,10,100,1000,10000,100000',
+                    help='comma separated batch sizes')
+parser.add_argument('--repeat', type=int, default=20,
+                    help='timed predictions per batch size, the median is reported')
+args = parser.parse_args()
+
+if args.models:
+    models = {name: experiments.load_model(name)[0] for name in args.models}
+else:
+    X, y = make_classification(50000, n_features=6, n_informative=4, n_classes=5,
+                               n_clusters_per_class=2, random_state=0)
+    models = {'dt': DecisionTreeClassifier(min_samples_leaf=5, random_state=42).fit(X, y),
+              'rf': RandomForestClassifier(63, min_samples_leaf=5, random_state=42).fit(X, y)}
+
+
+def latency(predict, X):
+    # median seconds per call
+    times = []
+    for r in range(args.repeat):
+        start = time.perf_counter()
+        predict(X)
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+rng = np.random.default_rng(0)
+for name, model in models.items():
+    flat = flat_trees.FlatTrees.from_estimator(model)
+    predictors = {'flat': flat.predict, 'sklearn': model.predict}
+    print(f'{name}: {len(flat.roots)} trees, {len(flat.feature)} nodes')
+
+    for batch in map(int, args.batches.split(',')):
+        X = rng.standard_normal((batch, model.n_features_in_))
+        if not (flat.predict(X) == model.predict(X)).all():
+            raise AssertionError(f'{name}: flat predictions differ at batch size {batch}')
+        times = {p: latency(predict, X) for p, predict in predictors.items()}
+        print(f'batch {batch:>6d}\t' + '\t'.join(f'{p} {t * 1000:9.3f} ms' for p, t in times.items())
+              + f'\tspeedup {times["sklearn"] / times["flat"]:6.1f}x')
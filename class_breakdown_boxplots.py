@@ -8,69 +8,38 @@ Created on Fri Feb  7 18:12:08 2020
 
 '''
 Generates a boxplot for each machine learning algorithm results aggregated by class
-label for each feature subset. Uses ML.py output files and saves all figures to the
-specified path.
+label for each feature subset. Reads the per class precision of every test set from
+the results store of the ML.py results directory (see results_store.py) and saves
+all figures to the specified path. Figures are rendered by --workers processes, and
+only those whose results changed since the last run are rendered (see figures.py).
 
-Usage: python3 class_breakdown_boxplots.py path/to/ML.py/output/ path/to/save/figures/
+Usage: python3 class_breakdown_boxplots.py path/to/ML.py/output/ path/to/save/figures/ [--workers N]
 '''
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import sys
-import glob
-
-# Check for command line argument
-if len(sys.argv) < 4:
-    print('Usage: python3 class_breakdown_boxplots.py path/to/ML.py/output/ path/to/save/figures/')
-    exit()
-
-path = sys.argv[1]
-results_path = sys.argv[2]
-
-# read all available result files from ML.py script
-mylist = [f for f in glob.glob(path+"*classification_report.txt")]
-knn_list = [f for f in mylist if 'knn' in f]
-
-# create feature list from file names
-feature_list = [f.split('/')[-1].split('knn')[0] for f in knn_list]
-feature_list = list(set(feature_list))
-
-# load result information from ML.py text files and generate plots
-for l in feature_list:
-    for ml in ['knn','dt','rf']:
-    	# load data
-        temp_list = [f for f in glob.glob(path+l+ml+"*classification_report.txt")]
-        print(ml,len(temp_list))
-        df = pd.DataFrame()
-        for e in temp_list:
-            print(e)
-            with open(e) as f:
-                data = f.read()
-                data = eval(data)
-                for key, val in data.items():
-                   if key != 'accuracy':
-                        df = df.append( {'test':str(e.split('test')[1][0]),
-                                         'class':key,
-                                         'score':val['precision']}, ignore_index=True)
-        # remove unnecessary metrics
-        df = df[(df['class'] != 'weighted avg')&(df['class'] != 'micro avg')&(df['class'] != 'macro avg')]
-        # create plot
-        fig, ax = plt.subplots()
-        ax = sns.boxplot(x='class',y='score',data=df, ax=ax,color='white')
-        # plot labels
-        ax.set_xlabel('CLASS')
-        ax.set_ylabel('PRECISION')
-        if ml == 'knn':
-            ax.set_title('KNN')
-        if ml == 'dt':
-            ax.set_title('Decision Tree')
-        if ml == 'rf':
-            ax.set_title('Random Forest')
-        # rotate x-axis labels for readability
-        ax.set_xticklabels(ax.get_xticklabels(), rotation=90)
-        ax.tick_params(axis='both', which='major')
-        # save plot as png
-        print(ml+'_'+e.split('/')[-1].split(ml)[0]+'.pdf')
-        fig.savefig(results_path+ml+'_'+e.split('/')[-1].split(ml)[0]+'.png',bbox_inches='tight')
-        plt.close()
+import os
+import argparse
+import results_store
+import figures
+import timing
+
+parser = argparse.ArgumentParser(usage='python3 class_breakdown_boxplots.py path/to/ML.py/output/ path/to/save/figures/ [--workers N]')
+parser.add_argument('path')
+parser.add_argument('results_path')
+parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                    help='number of processes rendering figures')
+args = parser.parse_args()
+timing.start()
+
+# load the per class results of every feature subset, algorithm and test set
+with timing.stage('query') as stage:
+    scores = results_store.scores(args.path)
+    stage['rows'] = len(scores)
+
+# one figure per feature subset and algorithm
+jobs = {ml+'_'+l+'.png': (figures.class_boxplot, (df[['class','precision']].reset_index(drop=True), ml))
+        for (l, ml), df in scores.groupby(['features', 'ml'], sort=False)}
+
+with timing.stage('render') as stage:
+    rendered = figures.render(jobs, args.results_path, args.workers)
+    stage['rows'] = len(rendered)
+print(f'{len(rendered)} of {len(jobs)} figures rendered')
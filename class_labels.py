@@ -7,109 +7,43 @@ Created on Mon Feb 24 12:12:23 2020
 """
 
 '''
-Loads flow data aggregated with application labels using ndpi into a pandas DataFrame, adds class labels according to 
-specifications in the replace function. Creates original file with new csv with class labels as "savefile". Note that
-"csvfile" is overwritten if savefile is not specified.
+Loads flow data aggregated with application labels using ndpi into a pandas DataFrame, adds class labels according to
+the application to class mapping table class_map.csv (or the table given with --map). Creates original file with new
+csv with class labels as "savefile". Note that "csvfile" is overwritten if savefile is not specified. Either file may be
+csv, Parquet or Feather, chosen by extension. With --chunksize the file is relabeled in chunks of that many flows instead
+of being loaded whole. Applications missing from the mapping table keep their application label and are reported.
 
-Usage: class_labels.py csvfile [savefile=csvfile]
+Usage: class_labels.py csvfile [savefile=csvfile] [--map class_map.csv] [--chunksize N]
 '''
 
-import pandas as pd
-import sys
+import argparse
+import storage
+import class_mapping
+import timing
 
 # Check for command line argument
-if len(sys.argv) < 2:
-    print('Usage: class_labels.py csvfile [savefile=csvfile]')
-    sys.exit(-1)
+parser = argparse.ArgumentParser(usage='class_labels.py csvfile [savefile=csvfile] [--map class_map.csv] [--chunksize N]')
+parser.add_argument('file')
+parser.add_argument('savefile', nargs='?')
+parser.add_argument('--map', default=class_mapping.CLASS_MAP_FILE,
+                    help='csv table of app to class mappings')
+parser.add_argument('--chunksize', type=int, default=None,
+                    help='relabel the file in chunks of this many flows')
+args = parser.parse_args()
+timing.start()
 
 # if savefile not specified, overwrite csvfile
-file = sys.argv[1]
-if len(sys.argv) > 2:
-    savefile = sys.argv[2]
-else:
-    savefile = file
-
-# read csv file
-df = pd.read_csv(file)
-# remove zero duration flows
-df = df[df.duration > 0]
-    
-# add class label column to df with app label
-df['class'] = df['app']
-
-# replace ndpi application label with its corresponding class
-#  - add or remove rows here to edit application to class mappings
-df = df.replace({'class': {'Amazon'          :   'Big Tech', 
-                           'Apple'           :   'Big Tech', 
-                           'AppleiCloud'     :   'unknown', 
-                           'AppleiTunes'     :   'unknown', 
-                           'ApplePush'       :   'M2M Messaging',  
-                           'AppleStore'       :  'Big Tech',  
-                           'BGP'             :   'Network Operation', 
-                           'BitTorrent'      :   'File Transfer',  
-                           'COAP'            :   'unknown', 
-                           'Cloudflare'      :   'Network Operation', 
-                           'CNN'             :   'News/Information', 
-                           'DHCPV6'          :   'Network Operation', 
-                           'DNS'             :   'Network Operation', 
-                           'FTP_CONTROL'     :   'File Transfer', 
-                           'FTP_DATA'        :   'File Transfer', 
-                           'Facebook'        :   'unknown', 
-                           'GMail'           :   'unknown', 
-#                           'Github'          :   '', 
-                           'Google'          :   'Big Tech', 
-                           'GoogleDocs'      :   'unknown', 
-                           'GoogleDrive'     :   'unknown', 
-                           'GoogleHangout'   :   'Chat_VoIP',  
-                           'GoogleMaps'      :   'unknown', 
-                           'GoogleServices'  :   'M2M Messaging',  
-#                           'HTTP'            :   '', 
-                           'ICMP'            :   'Network Operation', 
-                           'ICMPV6'          :   'Network Operation', 
-                           'IGMP'            :   'Network Operation', 
-                           'IRC'             :   'Chat_VoIP', 
-                           'Kerberos'        :   'Authentication', 
-                           'LinkedIn'        :   'unknown', 
-                           'MDNS'            :   'Network Operation', 
-                           'MQTT'            :   'M2M Messaging', 
-                           'MS_OneDrive'     :   'unknown', 
-                           'Microsoft'       :   'Big Tech', 
-                           'MSN'             :   'News/Information', 
-                           'NFS'             :   'File Transfer', 
-                           'NTP'             :   'Network Operation',  
-                           'NetBIOS'         :   'unknown', 
-                           'Office365'       :   'unknown', 
-                           'Oscar'           :   'Chat_VoIP', 
-                           'PlayStore'       :   'Big Tech', 
-                           'QQ'              :   'Chat_VoIP', 
-                           'QUIC'            :   'Chat_VoIP', 
-                           'RDP'             :   'Remote login', 
-                           'RTMP'            :   'Chat_VoIP', 
-                           'Redis'           :   'unknown', 
-                           'RX'              :   'unknown', 
-                           'SIP'             :   'Chat_VoIP', 
-                           'SNMP'            :   'Network Management', 
-                           'SSDP'            :   'Network Operation', 
-                           'SSH'             :   'Remote login', 
-                           'SSL'             :   'HTTPS',
-                           'SSL_No_Cert'     :   'HTTPS', 
-                           'STUN'            :   'Chat_VoIP',  
-                           'Skype'           :   'Chat_VoIP',  
-                           'SkypeCall'       :   'Chat_VoIP', 
-                           'Slack'           :   'Chat_VoIP', 
-                           'Syslog'          :   'Network Management', 
-                           'TeamSpeak'       :   'Chat_VoIP', 
-                           'Teredo'          :   'Network Operation', 
-                           'Tor'             :   'unknown', 
-                           'Twitter'         :   'unknown', 
-                           'UPnP'            :   'Network Operation',
-                           'UbuntuONE'       :   'Big Tech', 
-                           'Viber'           :   'Chat_VoIP', 
-                           'Whois-DAS'       :   'Network Management', 
-                           'Wikipedia'       :   'News/Information', 
-                           'Yahoo'           :   'Big Tech', 
-                           'YouTube'         :   'Video Streaming', 
-#                           'unknown'         :   '', 
-                              }})
-
-df.to_csv(savefile, index=False)
+file = args.file
+savefile = args.savefile or file
+
+# application to class mappings
+#  - add or remove rows in class_map.csv to edit application to class mappings
+class_map = class_mapping.load_class_map(args.map)
+
+with storage.TableWriter(savefile) as writer, timing.stage('label', 0) as stage:
+    # a single chunk holding the whole file unless a chunk size is given
+    chunks = storage.iter_table(file, args.chunksize) if args.chunksize else [storage.read_table(file)]
+    # remove zero duration flows and add the class label column of their app labels
+    for df in class_mapping.label_chunks((df[df.duration > 0] for df in chunks), class_map):
+        stage['rows'] += len(df)
+        writer.write(df)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Maps nDPI application labels to class labels using the mapping table in
+class_map.csv. The mapping is applied to the categories of the app column once
+and then indexed by the category codes of every flow, so relabeling costs one
+array lookup regardless of the number of mapping entries. Applications missing
+from the table keep their application label as class.
+'''
+
+import os
+import pandas as pd
+import numpy as np
+
+# default mapping table, next to this file
+CLASS_MAP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'class_map.csv')
+
+
+def load_class_map(path = CLASS_MAP_FILE):
+    """
+    Loads an application to class mapping table. Lines starting with # are ignored.
+
+    Args:
+        path (str): csv file with app and class columns. Default class_map.csv.
+
+    Returns:
+        class_map (dict): class label of each application label.
+    """
+    table = pd.read_csv(path, comment='#', dtype=str, skip_blank_lines=True)
+    duplicated = table['app'][table['app'].duplicated()]
+    if not duplicated.empty:
+        raise ValueError(f'applications mapped more than once in {path}: {sorted(duplicated)}')
+    return dict(zip(table['app'], table['class']))
+
+
+def map_classes(app, class_map):
+    """
+    Computes the class label of every flow from its application label.
+
+    Args:
+        app (pandas.Series): application labels, preferably categorical.
+        class_map (dict): class label of each application label.
+
+    Returns:
+        classes (pandas.Series): categorical class labels with the index of app.
+    """
+    app = app.astype('category')
+    mapped = pd.Index([class_map.get(a, a) for a in app.cat.categories], dtype=object)
+    categories = pd.Index(mapped.unique())
+    # class code of every app category, then of every flow; missing apps stay missing
+    lookup = np.append(categories.get_indexer(mapped), -1)
+    codes = lookup[app.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories.astype(object)), index=app.index, name='class')
+
+
+def unmapped_apps(app, class_map):
+    """
+    Lists the application labels in app that have no entry in the mapping table.
+
+    Args:
+        app (pandas.Series): application labels.
+        class_map (dict): class label of each application label.
+
+    Returns:
+        apps (list): sorted unmapped application labels.
+    """
+    return sorted(a for a in pd.unique(app.dropna()) if a not in class_map)
+
+
+def label_chunks(chunks, class_map):
+    """
+    Adds the class label column to every chunk of flows, for class_labels.py and
+    pipeline.py. Once all chunks are labelled, the applications without a class
+    mapping are reported.
+
+    Args:
+        chunks (iterable): DataFrames of flows with an app column.
+        class_map (dict): class label of each application label.
+
+    Yields:
+        df (pandas.DataFrame): chunk with its class column.
+    """
+    unmapped = set()
+    for df in chunks:
+        unmapped.update(unmapped_apps(df['app'], class_map))
+        yield df.assign(**{'class': map_classes(df['app'], class_map)})
+    if unmapped:
+        print('Applications without a class mapping (kept as class):', ', '.join(sorted(unmapped)))
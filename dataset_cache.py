@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Caches data sets as one memory-mappable .npy array per column so repeated runs
+(every feature subset of ML.py, and every classifier within a run) load them
+without parsing the source file again. Every entry is named by the size and
+modification time of its source file, so a changed file gets a new entry. Entries
+are built in a private directory and published with an atomic rename, and an
+entry is never replaced once published: concurrent runs that build the same entry
+keep the first one published, and runs still reading an entry are unaffected.
+Entries of earlier versions of the file are removed once a newer one is
+published. Since the arrays are mapped read-only, concurrent runs on the same
+data share them through the page cache.
+'''
+
+import os
+import re
+import glob
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+import storage
+
+# cache directory used when none is given, inside the directory of the data file
+CACHE_DIRNAME = '.dataset_cache'
+
+
+def cache_path(path, cache_dir = None):
+    """
+    Finds the cache directory of a data file.
+
+    Args:
+        path (str): data file path.
+        cache_dir (str): directory holding cache entries. Default CACHE_DIRNAME next to path.
+
+    Returns:
+        cache (str): cache entry directory of path.
+    """
+    path = os.path.abspath(path)
+    cache_dir = cache_dir or os.path.join(os.path.dirname(path), CACHE_DIRNAME)
+    key = hashlib.sha1(path.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{os.path.basename(path)}-{key}')
+
+
+def load_dataset(path, columns = None, cache_dir = None):
+    """
+    Loads a data file from its column cache, building the cache first if it is
+    missing or older than the file. Numeric columns are memory-mapped read-only,
+    categorical columns are rebuilt from mapped category codes.
+
+    Args:
+        path (str): data file path, in any format read by storage.read_table.
+        columns (list): columns to load. Default None loads all columns.
+        cache_dir (str): directory holding cache entries. Default CACHE_DIRNAME next to path.
+
+    Returns:
+        df (pandas.DataFrame): loaded data.
+    """
+    stat = os.stat(path)
+    cache = _entry_path(cache_path(path, cache_dir), stat)
+    meta = _read_meta(cache)
+    if meta is None:
+        meta = _build(path, cache, stat)
+
+    data = {}
+    for column in columns or [c['name'] for c in meta['columns']]:
+        entry = next((c for c in meta['columns'] if c['name'] == column), None)
+        if entry is None:
+            raise KeyError(f'column {column} not in {path}')
+        values = np.load(os.path.join(cache, entry['file']), mmap_mode='r')
+        if 'categories' in entry:
+            values = pd.Categorical.from_codes(values, entry['categories'])
+        data[column] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def _entry_path(cache, stat):
+    # cache entry of one version of the data file
+    return f'{cache}-{stat.st_size}-{stat.st_mtime_ns}'
+
+
+def _read_meta(cache):
+    # metadata of a cache entry, or None when there is no complete entry
+    try:
+        with open(os.path.join(cache, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _build(path, cache, stat):
+    # write the columns of path into a private directory and publish it as the cache entry
+    # the cached train/test sets hold standardized features
+    df = storage.read_table(path, scaled=True)
+    tmp = f'{cache}.tmp{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+
+    meta = {'source': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'columns': []}
+    for n, column in enumerate(df.columns):
+        series = df[column]
+        entry = {'name': column, 'file': f'{n}.npy'}
+        if not pd.api.types.is_numeric_dtype(series.dtype):
+            series = series.astype('category')
+            entry['categories'] = series.cat.categories.tolist()
+            series = series.cat.codes
+        np.save(os.path.join(tmp, entry['file']), np.ascontiguousarray(series.to_numpy()))
+        meta['columns'].append(entry)
+    # metadata is written last so a partial entry is never used
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    try:
+        os.rename(tmp, cache)
+    except OSError:
+        # another process published the same entry first, use it
+        shutil.rmtree(tmp, ignore_errors=True)
+        meta = _read_meta(cache)
+        if meta is None:
+            raise
+        return meta
+
+    # remove the entries of earlier versions of the data file
+    base = cache.rsplit('-', 2)[0]
+    for entry in glob.glob(glob.escape(base) + '-*-*'):
+        if entry != cache and re.fullmatch(r'-\d+-\d+', entry[len(base):]):
+            shutil.rmtree(entry, ignore_errors=True)
+    return meta
@@ -8,30 +8,71 @@ Created on Tue Apr 16 12:14:37 2019
 
 '''
 Expand data with engineered features using the feature_engineering_function.py
-Saves new csv file with specified name, overwriting input file if no save file
-name is given.
+Saves new data file (csv, Parquet or Feather by extension) with specified name,
+overwriting input file if no save file name is given. With --chunksize the file
+is streamed in chunks of that many flows instead of being loaded whole, for flow
+files larger than memory. With --error the distinct counts are HyperLogLog
+estimates with that relative standard error, which bounds the memory held per
+source address. With --window the counts are computed over time windows of that
+length keyed on the flow start time instead of over the whole file, in a single
+streaming pass over the time ordered flows (tumbling windows, or sliding windows
+advancing by --step). With --workers the flows of a file loaded whole are
+sharded by source address across that many processes; it cannot be combined
+with --chunksize or --window.
 
-Usage: engineered_features.py csvfile [savefile=csvfile]
+Usage: engineered_features.py csvfile [savefile=csvfile] [--chunksize N] [--error E]
+                              [--window SIZE [--step STEP]] [--workers N]
 '''
-import pandas as pd
-import sys
+import argparse
+import storage
 import feature_engineering_function
+import timing
 
 # Check for command line arguments
-if len(sys.argv) < 1:
-    print('Usage: engineered_features.py csvfile [savefile=csvfile]')
-    sys.exit(-1)
+parser = argparse.ArgumentParser(usage='engineered_features.py csvfile [savefile=csvfile] [--chunksize N] [--error E] [--window SIZE [--step STEP]] [--workers N]')
+parser.add_argument('file')
+parser.add_argument('savefile', nargs='?')
+parser.add_argument('--chunksize', type=int, default=None,
+                    help='stream the csv in chunks of this many flows')
+parser.add_argument('--error', type=float, default=None,
+                    help='approximate distinct counts with this relative standard error')
+parser.add_argument('--window', type=int, default=None,
+                    help='count over time windows of this length, in flow timestamp units')
+parser.add_argument('--step', type=int, default=None,
+                    help='slide the windows by this much instead of tumbling them')
+parser.add_argument('--workers', type=int, default=1,
+                    help='number of processes the flows are sharded across by source address')
+args = parser.parse_args()
+if args.workers > 1 and (args.chunksize or args.window):
+    parser.error('--workers applies to files loaded whole, not with --chunksize or --window')
+timing.start()
 
 # use original file name as new csv filename if none specified
-file = sys.argv[1]
-if len(sys.argv) > 2:
-    savefile = sys.argv[2]
-else:
-    savefile = file
+file = args.file
+savefile = args.savefile or file
 
-# read NetFlow data file
-df = pd.read_csv(file)
-# add engineered features
-df = feature_engineering_function.BLINC_features(df)
-# write NetFlow data file
-df.to_csv(savefile, index=False)
\ No newline at end of file
+if args.window:
+    # replay the time ordered NetFlow data file through the window state
+    window = feature_engineering_function.BLINCWindow(args.window, args.step, error=args.error)
+    with storage.TableWriter(savefile) as writer, timing.stage('BLINC windows', 0) as stage:
+        for chunk in storage.iter_table(file, args.chunksize or 100000):
+            writer.write(window.update(chunk))
+            stage['rows'] += len(chunk)
+elif args.chunksize:
+    # two streaming passes over the NetFlow data file
+    with timing.stage('BLINC features stream'):
+        feature_engineering_function.BLINC_features_stream(file, savefile, args.chunksize, args.error)
+else:
+    # read NetFlow data file
+    with timing.stage('load') as stage:
+        df = storage.read_table(file)
+        stage['rows'] = len(df)
+    # add engineered features
+    with timing.stage('BLINC features', len(df)):
+        if args.workers > 1:
+            df = feature_engineering_function.BLINC_features_parallel(df, args.workers, error=args.error)
+        else:
+            df = feature_engineering_function.BLINC_features(df, error=args.error)
+    # write NetFlow data file
+    with timing.stage('write', len(df)):
+        storage.write_table(df, savefile)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Evaluates fitted models on the test sets and keeps the results of a run in one
+JSON Lines file. All test sets are predicted in one concatenated batch; the
+labels are encoded as integer codes of the sorted class labels, so the confusion
+matrix of each test set is one bincount, and accuracy, precision, recall and
+F1-score are derived from it in the layout of scikit-learn's classification_report
+(output_dict=True). Each line of a results file holds one (features, algorithm,
+test set) evaluation with its confusion matrix and report.
+'''
+
+import os
+import glob
+import json
+import time
+import numpy as np
+import pandas as pd
+
+# prefix of the results file of every run in a results directory
+RESULTS_PREFIX = 'results_'
+
+
+def encode(y, labels):
+    """
+    Encodes class labels as their positions in the sorted label list.
+
+    Args:
+        y (array-like): class labels.
+        labels (numpy.ndarray): sorted class labels.
+
+    Returns:
+        codes (numpy.ndarray): label codes, -1 for labels not in the list.
+    """
+    return pd.Categorical(np.asarray(y), categories=labels).codes.astype(np.intp)
+
+
+def confusion(y_true, y_pred, n_labels):
+    """
+    Computes a confusion matrix from label codes.
+
+    Args:
+        y_true (numpy.ndarray): true label codes.
+        y_pred (numpy.ndarray): predicted label codes.
+        n_labels (int): number of labels.
+
+    Returns:
+        matrix (numpy.ndarray): counts of every (true, predicted) label pair,
+            rows true labels and columns predicted labels.
+    """
+    return np.bincount(y_true * n_labels + y_pred, minlength=n_labels * n_labels).reshape(n_labels, n_labels)
+
+
+def report(matrix, labels):
+    """
+    Derives the classification report of a confusion matrix, as given by
+    classification_report(output_dict=True) with zero_division=0. Labels neither
+    true nor predicted are left out.
+
+    Args:
+        matrix (numpy.ndarray): confusion matrix, rows true labels.
+        labels (numpy.ndarray): labels of the matrix rows and columns.
+
+    Returns:
+        report (dict): precision, recall, f1-score and support of every label,
+            accuracy, and the macro and weighted averages.
+    """
+    correct = np.diag(matrix).astype(float)
+    support = matrix.sum(axis=1).astype(float)
+    predicted = matrix.sum(axis=0).astype(float)
+    present = (support > 0) | (predicted > 0)
+    correct, support, predicted = correct[present], support[present], predicted[present]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, correct / predicted, 0.0)
+        recall = np.where(support > 0, correct / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    scores = {str(label): {'precision': float(p), 'recall': float(r), 'f1-score': float(f), 'support': float(s)}
+              for label, p, r, f, s in zip(np.asarray(labels)[present], precision, recall, f1, support)}
+    total = support.sum()
+    scores['accuracy'] = float(correct.sum() / total) if total else 0.0
+    scores['macro avg'] = {'precision': float(precision.mean()), 'recall': float(recall.mean()),
+                           'f1-score': float(f1.mean()), 'support': float(total)}
+    weights = support / total if total else support
+    scores['weighted avg'] = {'precision': float(precision @ weights), 'recall': float(recall @ weights),
+                              'f1-score': float(f1 @ weights), 'support': float(total)}
+    return scores
+
+
+def evaluate(model, test_dict, features, labels = None):
+    """
+    Predicts all test sets with one call on their concatenation and evaluates
+    every test set from its confusion matrix.
+
+    Args:
+        model: fitted classifier.
+        test_dict (dict): test data sets by test number, with a class column.
+        features (list): feature names the model was fitted on.
+        labels (list): class labels. Default None, the labels of the model.
+            Labels only found in the test sets or predictions are added.
+
+    Returns:
+        results (list): one dict per test set with its test number, labels,
+            confusion_matrix (nested lists, rows true labels), accuracy and report.
+    """
+    tests = list(test_dict)
+    sizes = [len(test_dict[t]) for t in tests]
+    y_true = np.concatenate([np.asarray(test_dict[t]['class']) for t in tests])
+    y_pred = np.asarray(model.predict(pd.concat([test_dict[t][features] for t in tests], ignore_index=True)))
+
+    labels = np.unique(np.concatenate([np.asarray(model.classes_ if labels is None else labels),
+                                       np.unique(y_true), np.unique(y_pred)]).astype(str))
+    true_codes = encode(y_true.astype(str), labels)
+    pred_codes = encode(y_pred.astype(str), labels)
+
+    results = []
+    for t, first, last in zip(tests, np.cumsum([0] + sizes[:-1]), np.cumsum(sizes)):
+        matrix = confusion(true_codes[first:last], pred_codes[first:last], len(labels))
+        scores = report(matrix, labels)
+        results.append({'test': int(t), 'labels': labels.tolist(), 'confusion_matrix': matrix.tolist(),
+                        'accuracy': scores['accuracy'], 'report': scores})
+    return results
+
+
+def results_file(results_path, run = None):
+    """
+    Gives the results file of a run.
+
+    Args:
+        results_path (str): results directory.
+        run (str): run name. Default None, the current local time and process id,
+            so runs started in the same second get files of their own.
+
+    Returns:
+        path (str): results file path.
+    """
+    return results_path+RESULTS_PREFIX+(run or time.strftime('%Y%m%d-%H%M%S')+'-'+str(os.getpid()))+'.jsonl'
+
+
+def write_results(results, path):
+    """
+    Appends evaluation results to a results file, one JSON object per line.
+
+    Args:
+        results (list): result dicts.
+        path (str): results file path.
+    """
+    with open(path, 'a') as f:
+        f.write(''.join(json.dumps(r, default=int) + '\n' for r in results))
+
+
+def read_results(results_path):
+    """
+    Reads the results of every run in a results directory. Of results of the same
+    features, algorithm and test set, the one of the latest run is kept.
+
+    Args:
+        results_path (str): results directory.
+
+    Returns:
+        results (list): result dicts, ordered by features, algorithm and test.
+    """
+    latest = {}
+    for path in sorted(glob.glob(os.path.join(results_path, RESULTS_PREFIX+'*.jsonl')), key=os.path.getmtime):
+        with open(path) as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue  # line cut short by a crash
+                latest[(tuple(r['features']), r['ml'], r['test'])] = r
+    return [latest[key] for key in sorted(latest)]
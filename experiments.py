@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Experiment definitions shared by ML.py and scheduler.py: the feature subsets, the
+classifiers with their hyper-parameter distributions, the naming of result files
+and the evaluation of a fitted model on the test sets.
+'''
+
+import os
+import json
+import hashlib
+from sklearn import tree
+from sklearn import ensemble
+from sklearn import neighbors
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import StratifiedKFold, RandomizedSearchCV, HalvingRandomSearchCV
+from scipy.stats import randint as sp_randint
+import warnings
+import sklearn
+from joblib import dump, load
+import storage
+import dataset_cache
+import flat_trees
+import evaluation
+from incremental_search import WarmStartForestSearch, NeighborGraphKNNSearch
+
+# feature subsets, where 1-7 add the engineered features to the base subset 0
+COMBINATIONS = {0: [['duration', 'dPkts', 'dOctets']],
+                1: [['duration', 'dPkts', 'dOctets', 'dstaddrcount']],
+                2: [['duration', 'dPkts', 'dOctets', 'srcportcount']],
+                3: [['duration', 'dPkts', 'dOctets', 'dstportunique']],
+                4: [['duration', 'dPkts', 'dOctets', 'dstaddrcount', 'srcportcount']],
+                5: [['duration', 'dPkts', 'dOctets', 'dstaddrcount', 'dstportunique']],
+                6: [['duration', 'dPkts', 'dOctets', 'srcportcount', 'dstportunique']],
+                7: [['duration', 'dPkts', 'dOctets', 'dstaddrcount', 'srcportcount', 'dstportunique']]}
+
+# classifier, hyper-parameter distributions and display name of each algorithm
+ALGORITHMS = {'knn': (neighbors.KNeighborsClassifier(),
+                      {"n_neighbors": sp_randint(1,128),
+                       "weights": ["uniform", "distance"]},
+                      'KNN'),
+              'dt': (tree.DecisionTreeClassifier(random_state=42),
+                     {"max_depth": [x for x in range(1,20)] + [None],
+                      "max_features": [1, 2, 3],
+                      "criterion": ["gini", "entropy"],
+                      "min_samples_leaf": [x for x in range(1,20)]},
+                     'Decision Tree'),
+              'rf': (ensemble.RandomForestClassifier(random_state=42),
+                     {"n_estimators": sp_randint(1,64),
+                      "max_features": [1, 2, 3],
+                      "max_depth": [x for x in range(1,20)] + [None],
+                      "criterion": ["gini", "entropy"],
+                      "min_samples_leaf": [x for x in range(1,20)]},
+                     'Random Forest')}
+
+# hyper-parameter search settings
+CV_FOLDS = 5
+N_ITER = 16
+SEARCHES = ['random', 'halving', 'incremental']
+# candidates kept per successive halving round, and the tree counts a forest grows
+# through (7, 21, 63) when halving over n_estimators; MAX_TREES is also the largest
+# forest of the incremental search
+HALVING_FACTOR = 3
+HALVING_MIN_TREES = 7
+MAX_TREES = 63
+
+# data sets loaded by this process, kept for the tasks run by scheduler.py workers
+_loaded = {}
+
+
+def feature_combos(spec):
+    """
+    Lists the feature sets of the feature subsets given on the command line.
+
+    Args:
+        spec (str): subset number, comma separated subset numbers or 'all'.
+
+    Returns:
+        combos (list): feature lists, in subset order.
+    """
+    subsets = list(COMBINATIONS) if spec == 'all' else [int(s) for s in spec.split(',')]
+    return [features for s in subsets for features in COMBINATIONS[s]]
+
+
+def make_search(ml, search = 'random', n_jobs = -1, random_state = None):
+    """
+    Creates the hyper-parameter search of an algorithm. 'random' fully fits every
+    candidate on every fold. 'halving' runs successive halving: all candidates are
+    fitted with a small resource, and only the best third advances to each next
+    round with three times the resource. The resource is the number of training
+    samples, except for random forests, whose forests are grown with more trees
+    (n_estimators) each round instead of sampling n_estimators. 'incremental'
+    scores a whole hyper-parameter axis from one fit per candidate and fold where
+    the algorithm allows it (n_estimators of random forests, and n_neighbors and
+    weights of KNN from one neighbor graph, see incremental_search.py) and falls
+    back to 'random' otherwise.
+
+    Args:
+        ml (str): algorithm key.
+        search (str): 'random', 'halving' or 'incremental'. Default 'random'.
+        n_jobs (int): parallel jobs of the search. Default -1 (all cores).
+        random_state (int): seed of the candidate sampling. Default None.
+
+    Returns:
+        search (sklearn.model_selection.BaseSearchCV): unfitted search.
+    """
+    model, param_dist, title = ALGORITHMS[ml]
+    if search == 'incremental' and ml == 'rf':
+        param_dist = {k: v for k, v in param_dist.items() if k != 'n_estimators'}
+        return WarmStartForestSearch(model, param_dist, max_trees=MAX_TREES, n_iter=N_ITER,
+                                     cv=CV_FOLDS, n_jobs=n_jobs, random_state=random_state)
+    if search == 'incremental' and ml == 'knn':
+        return NeighborGraphKNNSearch(model, max_neighbors=param_dist['n_neighbors'].b, weights=param_dist['weights'],
+                                      cv=CV_FOLDS, n_jobs=n_jobs)
+    if search in ('random', 'incremental'):
+        return RandomizedSearchCV(model, param_dist, cv=CV_FOLDS, n_jobs=n_jobs, n_iter=N_ITER, random_state=random_state)
+    if search != 'halving':
+        raise ValueError(f"unknown search '{search}', expected one of {SEARCHES}")
+    if 'n_estimators' in param_dist:
+        param_dist = {k: v for k, v in param_dist.items() if k != 'n_estimators'}
+        return HalvingRandomSearchCV(model, param_dist, n_candidates=N_ITER, factor=HALVING_FACTOR,
+                                     resource='n_estimators', min_resources=HALVING_MIN_TREES,
+                                     max_resources=MAX_TREES, cv=CV_FOLDS, n_jobs=n_jobs,
+                                     random_state=random_state)
+    return HalvingRandomSearchCV(model, param_dist, n_candidates=N_ITER, factor=HALVING_FACTOR,
+                                 min_resources='exhaust', cv=CV_FOLDS, n_jobs=n_jobs,
+                                 random_state=random_state)
+
+
+def experiment_name(features):
+    """
+    Gives the prefix of the result files of a feature set.
+
+    Args:
+        features (list): feature names.
+
+    Returns:
+        name (str): feature names joined by underscores.
+    """
+    return str(features).replace(' ','_').replace('[','').replace(']','').replace(',','').replace("'",'')
+
+
+def load_data(data_path, no_test_files, columns):
+    """
+    Loads the scaled train and test data sets through the column cache.
+
+    Args:
+        data_path (str): directory holding train_scale and test#_scale data files.
+        no_test_files (int): number of test data sets.
+        columns (list): columns to load.
+
+    Returns:
+        traindf (pandas.DataFrame): train data set.
+        test_dict (dict): test data sets by test number, starting at 1.
+    """
+    traindf = dataset_cache.load_dataset(storage.find_table(data_path+'train_scale'), columns=columns)
+    test_dict = {}
+    for i in range(1,no_test_files+1):
+        test_dict[i] = dataset_cache.load_dataset(storage.find_table(f'{data_path}test{i}_scale'), columns=columns)
+    return traindf, test_dict
+
+
+def data_version(data_path, no_test_files):
+    """
+    Identifies the current version of the scaled train and test data sets by the
+    size and modification time of their files.
+
+    Args:
+        data_path (str): directory holding train_scale and test#_scale data files.
+        no_test_files (int): number of test data sets.
+
+    Returns:
+        version (str): hexadecimal digest, which changes when any data set is rewritten.
+    """
+    files = [storage.find_table(data_path+'train_scale')]
+    files += [storage.find_table(f'{data_path}test{i}_scale') for i in range(1,no_test_files+1)]
+    stats = [(os.path.basename(f), os.stat(f).st_size, os.stat(f).st_mtime_ns) for f in files]
+    return hashlib.sha1(json.dumps(stats).encode()).hexdigest()[:16]
+
+
+def evaluate(model, features, ml, test_dict, labels):
+    """
+    Predicts every test set with a fitted model and evaluates it on each test set
+    (see evaluation.py).
+
+    Args:
+        model: fitted classifier or search object.
+        features (list): feature names the model was fitted on.
+        ml (str): algorithm key, 'knn', 'dt' or 'rf'.
+        test_dict (dict): test data sets by test number.
+        labels (list): sorted class labels.
+
+    Returns:
+        results (list): one result dict per test set, with the features, ml,
+            best hyper-parameters and cross validation score of the model, to
+            be written to the results file of the run.
+    """
+    estimator = getattr(model, 'best_estimator_', model)
+    params = getattr(model, 'best_params_', None)
+    cv_score = float(model.best_score_) if hasattr(model, 'best_score_') else None
+    results = evaluation.evaluate(estimator, test_dict, features, labels)
+    for result in results:
+        print('test '+str(result['test'])+' accuracy:\t\t'+str(result['accuracy']))
+        print(ALGORITHMS[ml][2]+' test '+str(result['test']), result['report'])
+        result.update(features=features, ml=ml, params=params, cv_score=cv_score)
+    return results
+
+
+def model_path(features, ml, results_path):
+    """
+    Gives the file a model of an experiment is saved to.
+
+    Args:
+        features (list): feature names.
+        ml (str): algorithm key.
+        results_path (str): results directory.
+
+    Returns:
+        path (str): model file path.
+    """
+    return results_path+experiment_name(features)+'_'+ml+'.joblib'
+
+
+def save_model(model, features, ml, results_path, compress = 0):
+    """
+    Saves the fitted model of an experiment to the results directory. Of a search
+    object only the refitted best estimator is kept, along with the features,
+    hyper-parameters and cross validation score as metadata. Uncompressed models
+    can be loaded memory-mapped by load_model, so processes loading the same model
+    share its arrays through the page cache; compressing trades that for a smaller file.
+
+    Args:
+        model: fitted classifier or search object.
+        features (list): feature names the model was fitted on.
+        ml (str): algorithm key.
+        results_path (str): results directory.
+        compress (int): joblib compression level, 0-9. Default 0 (uncompressed).
+
+    Returns:
+        path (str): model file path.
+    """
+    estimator = getattr(model, 'best_estimator_', model)
+    metadata = {'features': features, 'ml': ml,
+                'params': getattr(model, 'best_params_', estimator.get_params()),
+                'cv_score': float(model.best_score_) if hasattr(model, 'best_score_') else None,
+                'sklearn_version': sklearn.__version__}
+    path = model_path(features, ml, results_path)
+    dump({'estimator': estimator, 'metadata': metadata}, path, compress=compress)
+    return path
+
+
+def load_model(path, mmap_mode = 'r'):
+    """
+    Loads a model saved by save_model, or the flat arrays of a tree model exported
+    by export_trees.py (.npz). The numpy arrays of uncompressed models (the
+    training set of KNN models) are memory-mapped with mmap_mode; joblib loads
+    compressed models into memory regardless.
+
+    Args:
+        path (str): model file path.
+        mmap_mode (str): numpy memory-map mode, or None to read into memory. Default 'r'.
+
+    Returns:
+        estimator: fitted classifier.
+        metadata (dict): features, ml, params, cv_score and sklearn_version of the
+            model, empty for exported tree models and for whole search objects
+            saved by earlier versions of ML.py.
+    """
+    if path.endswith('.npz'):
+        return flat_trees.FlatTrees.load(path), {}
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='mmap_mode .* is not compatible with compressed file')
+        saved = load(path, mmap_mode=mmap_mode)
+    if isinstance(saved, dict) and 'estimator' in saved:
+        return saved['estimator'], saved['metadata']
+    return getattr(saved, 'best_estimator_', saved), {}
+
+
+def cv_task(data_path, no_test_files, columns, features, ml, params, fold):
+    """
+    Fits one hyper-parameter candidate on the training part of one cross
+    validation fold and scores it on the held out part, as RandomizedSearchCV does.
+
+    Args:
+        data_path (str): data directory.
+        no_test_files (int): number of test data sets.
+        columns (list): columns loaded from the data sets.
+        features (list): feature names.
+        ml (str): algorithm key.
+        params (dict): hyper-parameter candidate.
+        fold (int): fold number.
+
+    Returns:
+        score (float): accuracy on the held out part of the fold.
+    """
+    traindf, _ = _cached_data(data_path, no_test_files, columns)
+    X, y = traindf[features], traindf['class']
+    train, test = list(StratifiedKFold(CV_FOLDS).split(X, y))[fold]
+    model = clone(ALGORITHMS[ml][0]).set_params(**params)
+    model.fit(X.iloc[train], y.iloc[train])
+    return model.score(X.iloc[test], y.iloc[test])
+
+
+def final_task(data_path, no_test_files, columns, features, ml, params, results_path, compress = 0):
+    """
+    Refits the best candidate on the whole train set, saves it to the results
+    directory and evaluates it on the test sets.
+
+    Args:
+        data_path (str): data directory.
+        no_test_files (int): number of test data sets.
+        columns (list): columns loaded from the data sets.
+        features (list): feature names.
+        ml (str): algorithm key.
+        params (dict): best hyper-parameters.
+        results_path (str): results directory.
+        compress (int): joblib compression level of the saved model. Default 0.
+
+    Returns:
+        results (list): evaluation results of the test sets, see evaluate.
+    """
+    traindf, test_dict = _cached_data(data_path, no_test_files, columns)
+    labels = sorted(traindf['class'].unique())
+    model = clone(ALGORITHMS[ml][0]).set_params(**params)
+    model.fit(traindf[features], traindf['class'])
+    save_model(model, features, ml, results_path, compress)
+    results = evaluate(model, features, ml, test_dict, labels)
+    for result in results:
+        result['params'] = params
+    return results
+
+
+def _cached_data(data_path, no_test_files, columns):
+    # data sets of a worker process, loaded by its first task
+    key = (data_path, no_test_files, tuple(columns))
+    if key not in _loaded:
+        _loaded[key] = load_data(data_path, no_test_files, columns)
+    return _loaded[key]
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Exports the decision tree or random forest saved by ML.py (feature_subset_dt.joblib,
+feature_subset_rf.joblib) to the flat node arrays of flat_trees.py, saved as an
+.npz file next to the model unless a savefile is given. The exported model
+predicts the same classes without scikit-learn's per call validation, which makes
+it faster for the small batches of inference_server.py but slower than
+scikit-learn above about a thousand flows, see benchmark_trees.py.
+
+Usage: export_trees.py model.joblib [savefile.npz]
+'''
+
+import sys
+import experiments
+import flat_trees
+import timing
+
+# Check for command line arguments
+if len(sys.argv) < 2:
+    print('Usage: python3 export_trees.py model.joblib [savefile.npz]')
+    exit()
+
+model_file = sys.argv[1]
+savefile = sys.argv[2] if len(sys.argv) > 2 else model_file.rsplit('.', 1)[0] + '.npz'
+timing.start()
+
+with timing.stage('load'):
+    estimator, metadata = experiments.load_model(model_file)
+with timing.stage('export'):
+    flat = flat_trees.FlatTrees.from_estimator(estimator)
+    flat.save(savefile)
+print(f'{len(flat.roots)} trees, {len(flat.feature)} nodes saved to {savefile}')
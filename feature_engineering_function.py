@@ -7,35 +7,419 @@ Created on Tue Apr 16 11:33:44 2019
 """
 
 import pandas as pd
+import numpy as np
+import hyperloglog
+import storage
+from joblib import Parallel, delayed
 
-def BLINC_features(originaldf, savefile = False, filename = 'BLINC_features.csv'):
+# engineered feature columns in the order they are appended to the flow data
+BLINC_COLUMNS = ['dstaddrcount', 'srcportcount', 'dstportunique']
+
+# flow columns whose distinct values are counted per source address
+BLINC_SOURCES = {'dstaddrcount': 'dstaddr',
+                 'srcportcount': 'srcport',
+                 'dstportunique': 'dstport'}
+
+
+def BLINC_counts(originaldf):
+    """
+    Computes the BLINC distinct counts for every source address in one grouped
+    pass. Addresses and ports are integer encoded first so the grouping runs on
+    small integer codes instead of Python strings.
+
+    Args:
+        originaldf (pandas.DataFrame): flow data with srcaddr, dstaddr, srcport and dstport columns.
+
+    Returns:
+        src_codes (numpy.ndarray): integer code of the source address of each flow.
+        featuresdf (pandas.DataFrame): counts indexed by source address code, one row per unique srcaddr.
+    """
+    src_codes, _ = pd.factorize(originaldf['srcaddr'], use_na_sentinel=False)
+    codes = pd.DataFrame({'srcaddr': src_codes})
+    for column in BLINC_SOURCES.values():
+        codes[column] = pd.factorize(originaldf[column], use_na_sentinel=False)[0]
+
+    featuresdf = codes.groupby('srcaddr', sort=True).nunique()
+    featuresdf = featuresdf.rename(columns={v: k for k, v in BLINC_SOURCES.items()})
+    return src_codes, featuresdf[BLINC_COLUMNS]
+
+
+def BLINC_features(originaldf, savefile = False, filename = 'BLINC_features.csv', engine = 'groupby', error = None):
     """
     This function computes flow features based on the BLINC research
-    
+
     Args:
         originaldf (pandas.DataFrame): df to be augmented with engineered features.
         savefile (bool): Set True to save resulting df as csv in addition to being returned. Default False.
         filename (str): File name for csv if savefile is True. Default 'BLINC_features.csv'
-        
+        engine (str): 'groupby' computes all counts in one grouped pass, 'loop' rescans
+            the df once per source address (original implementation, kept for reference). Default 'groupby'.
+        error (float): if given, counts are HyperLogLog estimates with this relative standard
+            error instead of exact counts. Default None.
+
     Returns:
         originaldf (pandas.DataFrame): df augmented with engineered features.
     """
 
+    if error is not None:
+        featuresdf = BLINC_accumulated_counts(BLINC_accumulate(originaldf, error=error), error)
+        originaldf = BLINC_attach(originaldf.copy(), featuresdf)
+    elif engine == 'groupby':
+        src_codes, featuresdf = BLINC_counts(originaldf)
+        # broadcast per source counts back onto every flow through the source codes
+        originaldf = originaldf.copy()
+        for column in BLINC_COLUMNS:
+            originaldf[column] = featuresdf[column].to_numpy()[src_codes]
+    elif engine == 'loop':
+        originaldf = _BLINC_features_loop(originaldf)
+    else:
+        raise ValueError(f"unknown BLINC engine '{engine}', expected 'groupby' or 'loop'")
+
+    if savefile == True:
+    	# save originaldf with features to csv
+    	originaldf.to_csv(filename, index = False)
+    return originaldf
+
+
+def BLINC_features_parallel(originaldf, workers, error = None):
+    """
+    Computes BLINC features in worker processes. Since every count only depends
+    on the flows of one source address, the flows are hash partitioned by srcaddr
+    so each shard holds all flows of its sources and can be counted on its own.
+    Workers return the counts of their flows, which are scattered back into the
+    original row order.
+
+    Args:
+        originaldf (pandas.DataFrame): df to be augmented with engineered features.
+        workers (int): number of worker processes.
+        error (float): relative standard error of approximate counts. Default None counts exactly.
+
+    Returns:
+        originaldf (pandas.DataFrame): df augmented with engineered features.
+    """
+    columns = ['srcaddr'] + list(BLINC_SOURCES.values())
+    shard = pd.util.hash_pandas_object(originaldf['srcaddr'], index=False).to_numpy() % workers
+    positions = [np.flatnonzero(shard == n) for n in range(workers)]
+    flows = originaldf[columns]
+
+    results = Parallel(n_jobs=workers)(delayed(_BLINC_shard)(flows.iloc[rows], error) for rows in positions)
+    values = np.empty((len(originaldf), len(BLINC_COLUMNS)), dtype=np.int64)
+    for rows, result in zip(positions, results):
+        values[rows] = result
+
+    originaldf = originaldf.copy()
+    originaldf[BLINC_COLUMNS] = values
+    return originaldf
+
+
+def _BLINC_shard(flows, error):
+    # BLINC counts of every flow in one shard, in shard row order
+    if error is None:
+        src_codes, featuresdf = BLINC_counts(flows)
+        return featuresdf.to_numpy()[src_codes]
+    featuresdf = BLINC_accumulated_counts(BLINC_accumulate(flows, error=error), error)
+    return featuresdf.reindex(flows['srcaddr']).to_numpy()
+
+
+def BLINC_attach(df, featuresdf):
+    """
+    Appends per source address BLINC counts to the flows of df in place.
+
+    Args:
+        df (pandas.DataFrame): flow data.
+        featuresdf (pandas.DataFrame): BLINC counts indexed by srcaddr.
+
+    Returns:
+        df (pandas.DataFrame): df with the BLINC columns set.
+    """
+    features = featuresdf.reindex(df['srcaddr'])
+    for column in BLINC_COLUMNS:
+        df[column] = features[column].to_numpy()
+    return df
+
+
+def _BLINC_features_loop(originaldf):
     # Create featuredf with unique source address
-    featuresdf = pd.DataFrame(columns=['srcaddr','dstaddrcount','srcportcount','dstportunique'])
+    featuresdf = pd.DataFrame(columns=['srcaddr'] + BLINC_COLUMNS)
     featuresdf['srcaddr'] = list(originaldf['srcaddr'].unique())
 
     # find unique src/dst port and dst address counts and add to featuresdf
     for i, row in featuresdf.iterrows():
         tempdf = originaldf[originaldf['srcaddr'] == row['srcaddr']]
-        featuresdf['dstaddrcount'][i] = len(tempdf['dstaddr'].unique())
-        featuresdf['srcportcount'][i] = len(tempdf['srcport'].unique())
-        featuresdf['dstportunique'][i] = len(tempdf['dstport'].unique())
-        print(f'{(i/len(featuresdf))*100:.0f}%')	# print percentage completed
+        featuresdf.at[i, 'dstaddrcount'] = len(tempdf['dstaddr'].unique())
+        featuresdf.at[i, 'srcportcount'] = len(tempdf['srcport'].unique())
+        featuresdf.at[i, 'dstportunique'] = len(tempdf['dstport'].unique())
+    featuresdf[BLINC_COLUMNS] = featuresdf[BLINC_COLUMNS].astype(np.int64)
 
     # append engineered data from featuresdf to originaldf
-    originaldf = originaldf.reset_index().merge(featuresdf, how='left').set_index('index')
-    if savefile == True:
-    	# save originaldf with features to csv
-    	originaldf.to_csv(filename, index = False)
-    return originaldf
\ No newline at end of file
+    return originaldf.reset_index().merge(featuresdf, how='left').set_index('index')
+
+
+def BLINC_accumulate(df, acc = None, error = None):
+    """
+    Accumulates what is needed to compute the BLINC counts of a flow file one
+    chunk at a time. In exact mode these are the distinct (srcaddr, value) pairs,
+    in approximate mode the HyperLogLog registers of every source address. New
+    chunks are kept pending and only merged once they outgrow the merged part,
+    which keeps the merge cost linear in the number of chunks. Accumulators
+    built from different chunks or processes can be combined with BLINC_combine.
+
+    Args:
+        df (pandas.DataFrame): chunk of flow data.
+        acc (dict): accumulator returned by a previous call. Default None starts a new one.
+        error (float): relative standard error of approximate counts. Default None counts exactly.
+
+    Returns:
+        acc (dict): per feature list of frames, the first one merged.
+    """
+    if acc is None:
+        acc = {feature: [] for feature in BLINC_COLUMNS}
+    for feature, column in BLINC_SOURCES.items():
+        if error is None:
+            acc[feature].append(df[['srcaddr', column]].drop_duplicates())
+        else:
+            acc[feature].append(hyperloglog.hll_registers(df['srcaddr'], df[column], hyperloglog.hll_precision(error)))
+        pending = sum(len(f) for f in acc[feature][1:])
+        if len(acc[feature]) > 1 and pending > len(acc[feature][0]):
+            acc[feature] = [_merge(acc[feature], error)]
+    return acc
+
+
+def BLINC_combine(accs, error = None):
+    """
+    Combines accumulators built over different parts of the same flow data.
+
+    Args:
+        accs (list): accumulators returned by BLINC_accumulate.
+        error (float): error the accumulators were built with. Default None (exact).
+
+    Returns:
+        acc (dict): combined accumulator.
+    """
+    return {feature: [_merge([f for acc in accs for f in acc[feature]], error)] for feature in BLINC_COLUMNS}
+
+
+def BLINC_accumulated_counts(acc, error = None):
+    """
+    Computes the BLINC counts per source address from an accumulator.
+
+    Args:
+        acc (dict): accumulator returned by BLINC_accumulate or BLINC_combine.
+        error (float): error the accumulator was built with. Default None (exact).
+
+    Returns:
+        featuresdf (pandas.DataFrame): BLINC counts indexed by srcaddr.
+    """
+    counts = {}
+    for feature, frames in acc.items():
+        merged = _merge(frames, error)
+        if error is None:
+            counts[feature] = merged.groupby('srcaddr').size()
+        else:
+            counts[feature] = hyperloglog.hll_estimate(merged, hyperloglog.hll_precision(error))
+    featuresdf = pd.DataFrame(counts)[BLINC_COLUMNS]
+    featuresdf.index.name = 'srcaddr'
+    return featuresdf
+
+
+def _merge(frames, error):
+    # every accumulated frame is already free of duplicates
+    if len(frames) == 1:
+        return frames[0]
+    if error is None:
+        return pd.concat(frames, ignore_index=True).drop_duplicates()
+    return hyperloglog.hll_merge(frames)
+
+
+class BLINCWindow:
+    """
+    Maintains BLINC counts over a time window for a live flow feed. Time is cut
+    into panes of step length keyed on a flow timestamp column, and a window is
+    the size // step most recent panes ending at a flow's pane, so step == size
+    gives tumbling windows and a smaller step gives sliding windows.
+
+    Every pane keeps its state per source address: the set of distinct values
+    of each counted column, or their HyperLogLog registers. In exact mode the
+    window ending at the newest pane also keeps, per source and value, the number
+    of its panes holding the value, so the count of a source is the size of its
+    entry. A batch is only merged into the state of the sources it contains, and
+    only their counts are read, so the cost of a batch grows with the batch and
+    not with the flows in the window. Flows of older panes still in the window
+    are counted from the panes of their own window, and flows of panes that
+    already left the window from the batch alone. Panes that fall out of the
+    window behind the newest pane are evicted.
+
+    Args:
+        size (int): window length, in the units of the timestamp column.
+        step (int): pane length, must divide size. Default None (tumbling windows).
+        timestamp (str): flow timestamp column the windows are keyed on. Default 'first'.
+        error (float): relative standard error of approximate counts. Default None counts exactly.
+    """
+
+    def __init__(self, size, step = None, timestamp = 'first', error = None):
+        self.step = step or size
+        if size % self.step:
+            raise ValueError(f'window size {size} is not a multiple of the step {self.step}')
+        self.panes_per_window = size // self.step
+        self.timestamp = timestamp
+        self.error = error
+        self.precision = None if error is None else hyperloglog.hll_precision(error)
+        # pane -> feature -> srcaddr -> distinct values, or (register, rho) arrays
+        self.panes = {}
+        # feature -> srcaddr -> value -> panes of the newest window holding it (exact mode)
+        self.counts = {feature: {} for feature in BLINC_COLUMNS}
+        self.latest = None
+
+    def update(self, batch):
+        """
+        Adds a batch of flows to the window state.
+
+        Args:
+            batch (pandas.DataFrame): newly arrived flows.
+
+        Returns:
+            batch (pandas.DataFrame): copy of batch with the BLINC counts of the window of each flow.
+        """
+        return batch.assign(**dict(zip(BLINC_COLUMNS, self.count(batch).T)))
+
+    def count(self, batch):
+        """
+        Adds a batch of flows to the window state, as update, without copying the batch.
+
+        Args:
+            batch (pandas.DataFrame): newly arrived flows.
+
+        Returns:
+            values (numpy.ndarray): BLINC counts of the window of each flow, one column per BLINC_COLUMNS.
+        """
+        pane = (batch[self.timestamp].to_numpy() // self.step).astype(np.int64)
+        srcaddr = batch['srcaddr'].to_numpy()
+        if self.error is None:
+            observed = {feature: batch[column].to_numpy() for feature, column in BLINC_SOURCES.items()}
+        else:
+            # (register, rho) of every flow, hashed once for the whole batch
+            observed = {feature: hyperloglog.hll_hash(batch[column], self.precision)
+                        for feature, column in BLINC_SOURCES.items()}
+        values = np.zeros((len(batch), len(BLINC_COLUMNS)), dtype=np.int64)
+        panes = np.unique(pane)
+        # panes in time order, each counted once its flows are added
+        for p in panes:
+            rows = pane == p if len(panes) > 1 else slice(None)
+            if self.latest is not None and p <= self.latest - self.panes_per_window:
+                # the pane already left the window, count the batch's flows alone
+                acc = BLINC_accumulate(batch[rows], error=self.error)
+                values[rows] = BLINC_accumulated_counts(acc, self.error).reindex(srcaddr[rows]).to_numpy()
+                continue
+            if self.latest is None or p > self.latest:
+                self._advance(p)
+            codes, sources = pd.factorize(srcaddr[rows], use_na_sentinel=False)
+            if self.error is None:
+                self._add(p, srcaddr[rows], {feature: v[rows] for feature, v in observed.items()})
+            else:
+                self._add(p, (codes, sources), {feature: (r[rows], h[rows]) for feature, (r, h) in observed.items()})
+            values[rows] = self._window_counts(p, sources)[codes]
+        return values
+
+    def _advance(self, latest):
+        # make latest the newest pane, evicting the panes that fall out of its window
+        self.latest = latest
+        oldest = latest - self.panes_per_window + 1
+        for p in [p for p in self.panes if p < oldest]:
+            if self.error is None:
+                for feature, sources in self.panes[p].items():
+                    counts = self.counts[feature]
+                    for src, seen in sources.items():
+                        entry = counts[src]
+                        for value in seen:
+                            if entry[value] > 1:
+                                entry[value] -= 1
+                            else:
+                                del entry[value]
+                        if not entry:
+                            del counts[src]
+            del self.panes[p]
+
+    def _add(self, p, srcaddr, observed):
+        # merge the flows of pane p into the state of their sources; exact mode
+        # takes the srcaddr and value of every flow, HLL mode the factorized
+        # srcaddr and the (register, rho) of every flow
+        state = self.panes.setdefault(p, {feature: {} for feature in BLINC_COLUMNS})
+        for feature in BLINC_COLUMNS:
+            sources = state[feature]
+            if self.error is None:
+                counts = self.counts[feature]
+                for src, value in zip(srcaddr, observed[feature]):
+                    seen = sources.get(src)
+                    if seen is None:
+                        seen = sources[src] = set()
+                    if value not in seen:
+                        seen.add(value)
+                        entry = counts.get(src)
+                        if entry is None:
+                            entry = counts[src] = {}
+                        entry[value] = entry.get(value, 0) + 1
+                continue
+            codes, uniques = srcaddr
+            register, rho = observed[feature]
+            order = np.argsort(codes, kind='stable')
+            bounds = np.cumsum(np.bincount(codes, minlength=len(uniques)))
+            for src, rows in zip(uniques, np.split(order, bounds[:-1])):
+                # registers of the source as one dense array of the precision's size
+                dense = np.zeros(2**self.precision, dtype=np.uint8)
+                if src in sources:
+                    dense[sources[src][0]] = sources[src][1]
+                np.maximum.at(dense, register[rows], rho[rows])
+                nonzero = np.flatnonzero(dense)
+                sources[src] = (nonzero.astype(np.int32), dense[nonzero])
+
+    def _window_counts(self, pane, srcaddrs):
+        # BLINC counts of srcaddrs over the window ending at pane, one row per source
+        panes = [self.panes[p] for p in range(pane - self.panes_per_window + 1, pane + 1) if p in self.panes]
+        counts = np.zeros((len(srcaddrs), len(BLINC_COLUMNS)), dtype=np.int64)
+        for j, feature in enumerate(BLINC_COLUMNS):
+            if self.error is None and pane == self.latest:
+                entries = self.counts[feature]
+                counts[:, j] = [len(entries.get(src, ())) for src in srcaddrs]
+            elif self.error is None:
+                counts[:, j] = [len(set().union(*(p[feature].get(src, ()) for p in panes))) for src in srcaddrs]
+            else:
+                # dense registers for a block of sources at a time bound the memory
+                for start in range(0, len(srcaddrs), 256):
+                    block = srcaddrs[start:start + 256]
+                    dense = np.zeros((len(block), 2**self.precision), dtype=np.uint8)
+                    for i, src in enumerate(block):
+                        for p in panes:
+                            if src in p[feature]:
+                                register, rho = p[feature][src]
+                                dense[i, register] = np.maximum(dense[i, register], rho)
+                    counts[start:start + len(block), j] = hyperloglog.hll_dense_estimate(dense, self.precision)
+        return counts
+
+
+def BLINC_features_stream(file, savefile, chunksize = 1000000, error = None):
+    """
+    Computes BLINC features for a flow file without loading it into memory.
+    The first pass reads the file in chunks and accumulates the distinct values
+    seen per source address, the second pass re-reads it and writes every chunk
+    with the engineered features appended. Peak memory is one chunk plus the
+    distinct (srcaddr, value) pairs, or the HyperLogLog registers when error is given.
+
+    Args:
+        file (str): flow data file, csv, Parquet or Feather.
+        savefile (str): data file to write, may be the same as file.
+        chunksize (int): number of flows read per chunk. Default 1000000.
+        error (float): relative standard error of approximate counts. Default None counts exactly.
+
+    Returns:
+        featuresdf (pandas.DataFrame): BLINC counts indexed by srcaddr.
+    """
+    usecols = ['srcaddr'] + list(BLINC_SOURCES.values())
+    acc = None
+    for chunk in storage.iter_table(file, chunksize, columns=usecols):
+        acc = BLINC_accumulate(chunk, acc, error)
+    featuresdf = BLINC_accumulated_counts(acc, error)
+
+    with storage.TableWriter(savefile) as writer:
+        for chunk in storage.iter_table(file, chunksize):
+            writer.write(BLINC_attach(chunk, featuresdf))
+    return featuresdf
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Render stage of the figures of class_breakdown_boxplots.py and ci_viz.py. Every
+figure is a job of a plotting function of this module and the data it plots. The
+jobs whose figures are missing or whose content hash (the data, the other
+arguments and the source of the plotting function) differs from the one recorded
+in the manifest of the figure directory (figures_manifest.json) are rendered by
+worker processes with the non-interactive Agg backend; the others are skipped, so
+regenerating the figures after adding one experiment only renders its figures.
+'''
+
+import os
+import json
+import inspect
+import hashlib
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+import pandas as pd
+from joblib import Parallel, delayed
+import experiments
+
+# manifest of the rendered figures in a figure directory
+MANIFEST_FILE = 'figures_manifest.json'
+
+
+def class_boxplot(df, ml, path):
+    """
+    Plots the precision of every class across the test sets of one feature
+    subset and algorithm as boxplots.
+
+    Args:
+        df (pandas.DataFrame): class and precision columns, one row per class and test set.
+        ml (str): algorithm key.
+        path (str): figure file path.
+    """
+    fig, ax = plt.subplots()
+    ax = sns.boxplot(x='class',y='precision',data=df, ax=ax,color='white')
+    # plot labels
+    ax.set_xlabel('CLASS')
+    ax.set_ylabel('PRECISION')
+    ax.set_title(experiments.ALGORITHMS[ml][2])
+    # rotate x-axis labels for readability
+    ax.tick_params(axis='x', labelrotation=90)
+    fig.savefig(path,bbox_inches='tight')
+    plt.close(fig)
+
+
+def ci_errorbars(interval, ml, metric, limits, path):
+    """
+    Plots the mean and error interval of a metric of every feature subset of an
+    algorithm as error bars.
+
+    Args:
+        interval (pandas.DataFrame): features, mean and error columns.
+        ml (str): algorithm key.
+        metric (str): 'precision' or 'recall'.
+        limits (tuple): lower and upper limit of the score axis.
+        path (str): figure file path.
+    """
+    with plt.style.context('seaborn-v0_8-whitegrid'):
+        fig, ax = plt.subplots()
+        # create errorbars
+        ax.errorbar(x=interval['features'], y=interval['mean'], yerr=interval['error'], capsize=5, fmt='.k')
+        # plot labels
+        ax.set_xlabel('FEATURES')
+        ax.set_ylabel('SCORE')
+        ax.set_ylim(*limits)
+        ax.set_title(experiments.ALGORITHMS[ml][2]+' '+metric)
+        # rotate x-axis labels for better readability
+        ax.tick_params(axis='x', labelrotation=90)
+        fig.savefig(path, bbox_inches = "tight")
+        plt.close(fig)
+
+
+def content_hash(function, args):
+    """
+    Hashes a figure job: the source of its plotting function and its arguments,
+    DataFrames by their columns and values.
+
+    Args:
+        function (callable): plotting function.
+        args (tuple): arguments of the function, besides the figure path.
+
+    Returns:
+        digest (str): hexadecimal SHA-256 digest.
+    """
+    digest = hashlib.sha256(inspect.getsource(function).encode())
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            digest.update(repr(list(arg.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(arg, index=False).to_numpy().tobytes())
+        else:
+            digest.update(repr(arg).encode())
+    return digest.hexdigest()
+
+
+def render(jobs, figure_path, workers = 1):
+    """
+    Renders the figures whose content changed since the last render into a
+    figure directory, in parallel, and records them in its manifest.
+
+    Args:
+        jobs (dict): plotting function and its arguments, besides the figure
+            path, by figure file name.
+        figure_path (str): figure directory.
+        workers (int): number of worker processes. Default 1.
+
+    Returns:
+        rendered (list): file names of the rendered figures.
+    """
+    os.makedirs(figure_path, exist_ok=True)
+    manifest_file = os.path.join(figure_path, MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    hashes = {name: content_hash(function, args) for name, (function, args) in jobs.items()}
+    rendered = [name for name in jobs
+                if manifest.get(name) != hashes[name] or not os.path.exists(os.path.join(figure_path, name))]
+    Parallel(n_jobs=workers)(delayed(jobs[name][0])(*jobs[name][1], os.path.join(figure_path, name))
+                             for name in rendered)
+
+    # recorded only once all figures are saved, so a failed render is redone
+    manifest.update({name: hashes[name] for name in rendered})
+    with open(manifest_file + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifest_file + '.tmp', manifest_file)
+    return rendered
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Exports a fitted decision tree or random forest (the best model of ML.py) into
+flat NumPy node arrays and predicts from them without scikit-learn. The nodes of
+all trees are concatenated into one set of contiguous arrays (split feature,
+threshold, children and leaf class probabilities), which are walked for the whole
+batch at once, one tree level per step, without Python level per row work. Predictions are
+identical to those of the scikit-learn estimator: features are compared as
+float32 and tree probabilities are summed in tree order, as scikit-learn does.
+Models are exported with export_trees.py.
+'''
+
+import numpy as np
+
+# arrays saved by FlatTrees.save
+ARRAYS = ['feature', 'threshold', 'left', 'missing_left', 'proba', 'roots', 'classes']
+# (tree, row) pairs walked at a time, keeping the nodes of the walked trees in cache
+WALK_SIZE = 65536
+
+
+class FlatTrees:
+    """
+    Decision tree or random forest as flat node arrays. Nodes are numbered level
+    by level with the right child of a node right after its left child, so a row
+    moves to left + (x > threshold). Leaves point to themselves.
+
+    Args:
+        feature (numpy.ndarray): split feature of every node, 0 at leaves.
+        threshold (numpy.ndarray): split threshold of every node, inf at leaves.
+        left (numpy.ndarray): left child of every node, the node itself at leaves.
+        missing_left (numpy.ndarray): whether missing values go to the left child, True at leaves.
+        proba (numpy.ndarray): class probabilities of every node, (nodes, classes).
+        roots (numpy.ndarray): root node of every tree.
+        classes (numpy.ndarray): class labels.
+    """
+
+    def __init__(self, feature, threshold, left, missing_left, proba, roots, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.missing_left = missing_left
+        self.proba = proba
+        self.roots = roots
+        self.classes = classes
+        self.leaf = left == np.arange(len(left))
+
+    @property
+    def classes_(self):
+        # class labels under the scikit-learn attribute name
+        return self.classes
+
+    @classmethod
+    def from_estimator(cls, model):
+        """
+        Exports a fitted DecisionTreeClassifier or RandomForestClassifier, or a
+        search object holding one as best_estimator_.
+
+        Args:
+            model: fitted single output tree classifier, forest or search.
+
+        Returns:
+            flat (FlatTrees): flat arrays of the model's trees.
+        """
+        model = getattr(model, 'best_estimator_', model)
+        trees = [e.tree_ for e in getattr(model, 'estimators_', [model])]
+        if trees[0].n_outputs != 1:
+            raise ValueError('only single output classifiers can be exported')
+
+        # scikit-learn node arrays of all trees, concatenated
+        offsets = np.cumsum([0] + [t.node_count for t in trees])
+        children_left = np.concatenate([np.where(t.children_left == -1, -1, t.children_left + o)
+                                        for t, o in zip(trees, offsets)])
+        children_right = np.concatenate([np.where(t.children_right == -1, -1, t.children_right + o)
+                                         for t, o in zip(trees, offsets)])
+
+        # renumber level by level, placing both children of a node next to each other
+        order = [offsets[:-1]]
+        while len(order[-1]):
+            nodes = order[-1][children_left[order[-1]] != -1]
+            order.append(np.column_stack([children_left[nodes], children_right[nodes]]).ravel())
+        order = np.concatenate(order)
+        number = np.empty(len(order), dtype=np.intp)
+        number[order] = np.arange(len(order))
+
+        leaf = children_left[order] == -1
+        return cls(feature=np.where(leaf, 0, np.concatenate([t.feature for t in trees])[order]).astype(np.intp),
+                   threshold=np.where(leaf, np.inf, np.concatenate([t.threshold for t in trees])[order]),
+                   left=np.where(leaf, np.arange(len(order)), number[children_left[order]]),
+                   missing_left=leaf | np.concatenate([t.missing_go_to_left for t in trees])[order].astype(bool),
+                   proba=np.concatenate([t.value[:, 0, :] for t in trees])[order],
+                   roots=number[offsets[:-1]],
+                   classes=model.classes_)
+
+    def predict_proba(self, X):
+        """
+        Predicts class probabilities, averaged over the trees.
+
+        Args:
+            X (array-like): features, in the column order the model was fitted on.
+
+        Returns:
+            proba (numpy.ndarray): class probabilities, columns ordered as classes.
+        """
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[1], self.proba.shape[1]))
+        for tree_leaves in leaves:
+            proba += self.proba[tree_leaves]
+        if len(leaves) > 1:
+            proba /= len(leaves)
+        return proba
+
+    def predict(self, X):
+        """
+        Predicts class labels.
+
+        Args:
+            X (array-like): features, in the column order the model was fitted on.
+
+        Returns:
+            y_pred (numpy.ndarray): predicted labels.
+        """
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def apply(self, X):
+        """
+        Finds the leaf of every row in every tree. Trees are walked a few at a
+        time, all rows together, and rows are dropped once they reach a leaf.
+
+        Args:
+            X (array-like): features, in the column order the model was fitted on.
+
+        Returns:
+            leaves (numpy.ndarray): leaf node of every tree and row, (trees, rows).
+        """
+        # trees split float32 features; the transpose keeps each feature contiguous
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32).T)
+        n = X.shape[1]
+        missing = np.isnan(X).any()
+        leaves = np.empty((len(self.roots), n), dtype=np.intp)
+        step = max(WALK_SIZE // max(n, 1), 1)
+        for first in range(0, len(self.roots), step):
+            roots = self.roots[first:first + step]
+            out = leaves[first:first + step].reshape(-1)
+            node = np.repeat(roots, n)
+            rows = np.tile(np.arange(n), len(roots))
+            pending = np.arange(len(node))
+            while len(node):
+                x = X[self.feature[node], rows]
+                if missing:
+                    right = np.where(np.isnan(x), ~self.missing_left[node], x > self.threshold[node])
+                else:
+                    right = x > self.threshold[node]
+                node = self.left[node] + right
+                done = self.leaf[node]
+                out[pending[done]] = node[done]
+                walking = ~done
+                node, rows, pending = node[walking], rows[walking], pending[walking]
+        return leaves
+
+    def save(self, path):
+        """
+        Saves the node arrays to an .npz file.
+
+        Args:
+            path (str): file path.
+        """
+        np.savez(path, **{name: getattr(self, name) for name in ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads node arrays saved by save.
+
+        Args:
+            path (str): file path.
+
+        Returns:
+            flat (FlatTrees): loaded trees.
+        """
+        with np.load(path, allow_pickle=True) as arrays:
+            return cls(**{name: arrays[name] for name in ARRAYS})
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Compact column types shared by every loader of flow data. Labels are stored as
+categoricals, IPv4 addresses packed into 32 bit integers, and ports and NetFlow
+header fields in the smallest unsigned integer that holds them. The standardized
+features of the train/test sets are stored as float32 when read as scaled data.
+
+Every chunk of a file gets the same column types, so chunks can be accumulated,
+joined on addresses and appended to one output file: address columns are always
+packed, a missing address is packed as MISSING_ADDRESS (0.0.0.0, written back as
+a missing value), and addresses that are not IPv4 are rejected, since NetFlow v5
+records only carry IPv4 addresses.
+'''
+
+import pandas as pd
+import numpy as np
+
+# compact type of each known flow column; 'ipv4' columns are packed addresses
+SCHEMA = {'srcaddr': 'ipv4', 'dstaddr': 'ipv4', 'nexthop': 'ipv4',
+          'srcport': 'uint16', 'dstport': 'uint16',
+          'input': 'uint16', 'output': 'uint16',
+          'prot': 'uint8', 'tos': 'uint8', 'tcp_flags': 'uint8',
+          'src_mask': 'uint8', 'dst_mask': 'uint8',
+          'src_as': 'uint32', 'dst_as': 'uint32',
+          'first': 'uint32', 'last': 'uint32', 'duration': 'uint32',
+          'dPkts': 'uint32', 'dOctets': 'uint64',
+          'dstaddrcount': 'uint32', 'srcportcount': 'uint32', 'dstportunique': 'uint32',
+          'app': 'category', 'class': 'category'}
+
+# features standardized by split_scale_data.py, stored as float32 in scaled data
+SCALED_FEATURES = ['duration', 'dPkts', 'dOctets', 'dstaddrcount', 'srcportcount', 'dstportunique']
+
+# packed value of a missing address
+MISSING_ADDRESS = 0
+
+IPV4_PATTERN = r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}'
+
+
+def apply_schema(df, scaled = False):
+    """
+    Converts the known flow columns of df to their compact types. Integer columns
+    holding floats (e.g. missing values) are left as is, unless they are scaled
+    features of scaled data, which become float32.
+
+    Args:
+        df (pandas.DataFrame): flow data.
+        scaled (bool): df holds standardized features (train/test sets). Default False.
+
+    Returns:
+        df (pandas.DataFrame): flow data with compact column types.
+    """
+    converted = {}
+    for column in df.columns:
+        series = df[column]
+        dtype = SCHEMA.get(column)
+        if dtype == 'ipv4':
+            if not pd.api.types.is_integer_dtype(series.dtype):
+                converted[column] = pack_ipv4(series)
+            elif _fits(series, np.uint32):
+                converted[column] = series.astype(np.uint32)
+            else:
+                raise ValueError(f'{column} holds integers that are not packed IPv4 addresses')
+        elif dtype == 'category':
+            converted[column] = series.astype('category')
+        elif pd.api.types.is_float_dtype(series.dtype):
+            if scaled and column in SCALED_FEATURES:
+                converted[column] = series.astype(np.float32)
+        elif dtype is not None and pd.api.types.is_integer_dtype(series.dtype) and _fits(series, dtype):
+            converted[column] = series.astype(dtype)
+    return df.assign(**converted) if converted else df
+
+
+def pack_ipv4(series):
+    """
+    Packs dotted quad IPv4 address strings into 32 bit integers. Each distinct
+    address is only parsed once. Missing addresses are packed as MISSING_ADDRESS.
+
+    Args:
+        series (pandas.Series): address strings.
+
+    Returns:
+        packed (pandas.Series): uint32 addresses.
+
+    Raises:
+        ValueError: if an address is not a dotted quad IPv4 address (e.g. IPv6).
+    """
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Series(uniques, dtype=object).astype(str)
+    valid = uniques.str.fullmatch(IPV4_PATTERN)
+    octets = np.array(uniques[valid].str.split('.').tolist(), dtype=np.uint32).reshape(-1, 4)
+    if not valid.all() or (octets > 255).any():
+        invalid = uniques[~valid].tolist() + ['.'.join(map(str, o)) for o in octets[(octets > 255).any(axis=1)]]
+        raise ValueError(f'{series.name} holds addresses that are not IPv4, e.g. {invalid[0]}; '
+                         'read the file without the flow schema (schema=False)')
+    packed = (octets[:, 0] << 24) | (octets[:, 1] << 16) | (octets[:, 2] << 8) | octets[:, 3]
+    # code -1 of missing addresses takes the last entry
+    packed = np.append(packed, np.uint32(MISSING_ADDRESS)).astype(np.uint32)
+    return pd.Series(packed[codes], index=series.index, name=series.name)
+
+
+def unpack_ipv4(series):
+    """
+    Converts packed 32 bit IPv4 addresses back to dotted quad strings.
+
+    Args:
+        series (pandas.Series): uint32 addresses.
+
+    Returns:
+        addresses (pandas.Series): address strings, None for MISSING_ADDRESS.
+    """
+    codes, uniques = pd.factorize(series)
+    uniques = np.asarray(uniques, dtype=np.uint32)
+    octets = [(uniques >> shift) & 255 for shift in (24, 16, 8, 0)]
+    dotted = np.array(['.'.join(map(str, ip)) for ip in zip(*octets)], dtype=object)
+    dotted[uniques == MISSING_ADDRESS] = None
+    return pd.Series(dotted[codes], index=series.index, name=series.name)
+
+
+def ipv4_columns(df):
+    """
+    Lists the address columns of df that hold packed IPv4 addresses.
+
+    Args:
+        df (pandas.DataFrame): flow data.
+
+    Returns:
+        columns (list): names of the packed address columns.
+    """
+    return [c for c in df.columns if SCHEMA.get(c) == 'ipv4' and df[c].dtype == np.uint32]
+
+
+def _fits(series, dtype):
+    # True when every value of an integer column is representable in dtype
+    if series.empty:
+        return True
+    info = np.iinfo(dtype)
+    return series.min() >= info.min and series.max() <= info.max
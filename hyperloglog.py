@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Vectorized HyperLogLog sketches for approximate distinct counts per key. The
+registers of all keys are stored sparsely as rows of (key, register, rho) so that
+keys with few distinct values only hold a few registers, and sketches built from
+different chunks or processes are merged by taking the register maximum.
+'''
+
+import pandas as pd
+import numpy as np
+
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+
+
+def hll_precision(error):
+    """
+    Finds the number of register index bits giving the requested standard error.
+
+    Args:
+        error (float): relative standard error of the estimates, e.g. 0.01.
+
+    Returns:
+        p (int): precision, the sketches use 2**p registers per key.
+    """
+    p = int(np.ceil(np.log2((1.04 / error) ** 2)))
+    return min(max(p, MIN_PRECISION), MAX_PRECISION)
+
+
+def _bit_length(w):
+    # exact bit length of uint64 values, computed on 32 bit halves so the float
+    # conversion used by frexp never rounds
+    hi = (w >> np.uint64(32)).astype(np.float64)
+    lo = (w & np.uint64(0xffffffff)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+def hll_hash(values, p):
+    """
+    Hashes values to the HyperLogLog register they update and its rank.
+
+    Args:
+        values (pandas.Series): observations whose distinct count is estimated.
+        p (int): precision from hll_precision.
+
+    Returns:
+        register (numpy.ndarray): register index of each value.
+        rho (numpy.ndarray): rank of each value, the position of the first set
+            bit of the rest of its hash.
+    """
+    h = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    register = (h & np.uint64(2**p - 1)).astype(np.int32)
+    rho = (64 - p) - _bit_length(h >> np.uint64(p)) + 1
+    return register, rho.astype(np.uint8)
+
+
+def hll_registers(keys, values, p):
+    """
+    Builds the sparse HyperLogLog registers of the values seen for each key.
+
+    Args:
+        keys (pandas.Series): key of each observation, e.g. srcaddr.
+        values (pandas.Series): value of each observation whose distinct count is estimated.
+        p (int): precision from hll_precision.
+
+    Returns:
+        registers (pandas.DataFrame): columns key, register, rho with one row per non-empty register.
+    """
+    register, rho = hll_hash(values, p)
+    registers = pd.DataFrame({'key': np.asarray(keys), 'register': register, 'rho': rho})
+    return hll_merge([registers])
+
+
+def hll_merge(frames):
+    """
+    Merges register sets of the same precision.
+
+    Args:
+        frames (list): register DataFrames from hll_registers or hll_merge.
+
+    Returns:
+        registers (pandas.DataFrame): merged registers.
+    """
+    registers = pd.concat(frames, ignore_index=True)
+    return registers.groupby(['key', 'register'], sort=False)['rho'].max().reset_index()
+
+
+def hll_estimate(registers, p):
+    """
+    Estimates the distinct count of every key, using linear counting while few
+    registers are set.
+
+    Args:
+        registers (pandas.DataFrame): registers from hll_registers or hll_merge.
+        p (int): precision the registers were built with.
+
+    Returns:
+        estimates (pandas.Series): estimated distinct counts indexed by key.
+    """
+    grouped = registers.assign(inverse=np.exp2(-registers['rho'].astype(np.float64))).groupby('key', sort=False)
+    empty = 2**p - grouped.size()
+    return pd.Series(_estimate(grouped['inverse'].sum().to_numpy() + empty.to_numpy(), empty.to_numpy(), p),
+                     index=empty.index)
+
+
+def hll_dense_estimate(dense, p):
+    """
+    Estimates distinct counts from dense register arrays, as hll_estimate.
+
+    Args:
+        dense (numpy.ndarray): registers, one row of 2**p ranks per key.
+        p (int): precision the registers were built with.
+
+    Returns:
+        estimates (numpy.ndarray): estimated distinct count of each row.
+    """
+    return _estimate(np.exp2(-dense.astype(np.float64)).sum(axis=1), (dense == 0).sum(axis=1), p)
+
+
+def _estimate(inverse_sum, empty, p):
+    # HyperLogLog estimate from the sum of 2**-rho over all registers (empty
+    # ones counting 1) and the number of empty registers, using linear counting
+    # while few registers are set
+    m = 2**p
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    raw = alpha * m**2 / inverse_sum
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / np.where(empty > 0, empty, np.nan))
+    estimates = np.where((raw > 2.5 * m) | (empty == 0), raw, linear)
+    return estimates.round().astype(np.int64)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Hyper-parameter searches that score a whole hyper-parameter axis from a single
+fit per candidate and fold, instead of refitting for every value on that axis.
+They follow the interface of the scikit-learn searches (fit, predict, best_params_,
+best_score_, best_estimator_, cv_results_) so ML.py can use them in their place.
+'''
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.model_selection import ParameterSampler, StratifiedKFold
+from sklearn.neighbors import NearestNeighbors
+from sklearn.utils.validation import check_is_fitted
+
+
+class WarmStartForestSearch(ClassifierMixin, BaseEstimator):
+    """
+    Random forest search over structural hyper-parameters and n_estimators. For
+    every sampled structural candidate and CV fold, a single forest of max_trees
+    trees is grown, which holds the same trees warm_start growth would add one by
+    one. The class probabilities of its trees are accumulated in order, so the
+    held out accuracy of the forest at every tree count 1..max_trees comes from
+    that one fit. The best (candidate, tree count) pair is refit on all data.
+
+    Args:
+        estimator (sklearn.ensemble.RandomForestClassifier): forest to tune.
+        param_distributions (dict): structural hyper-parameters, without n_estimators.
+        max_trees (int): largest n_estimators evaluated. Default 63.
+        n_iter (int): number of structural candidates sampled. Default 16.
+        cv (int): number of stratified folds. Default 5.
+        n_jobs (int): parallel jobs used to grow the trees. Default None.
+        random_state (int): seed of the candidate sampling. Default None.
+    """
+
+    def __init__(self, estimator, param_distributions, max_trees = 63, n_iter = 16, cv = 5,
+                 n_jobs = None, random_state = None):
+        self.estimator = estimator
+        self.param_distributions = param_distributions
+        self.max_trees = max_trees
+        self.n_iter = n_iter
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        """
+        Runs the search and refits the best forest on X, y.
+
+        Args:
+            X (array-like): training features.
+            y (array-like): training labels.
+
+        Returns:
+            self (WarmStartForestSearch): fitted search.
+        """
+        data = X
+        X, y = np.asarray(X), np.asarray(y)
+        candidates = list(ParameterSampler(self.param_distributions, self.n_iter, random_state=self.random_state))
+        folds = list(StratifiedKFold(self.cv).split(X, y))
+
+        # held out accuracy of every candidate, fold and tree count
+        scores = np.empty((len(candidates), len(folds), self.max_trees))
+        for c, params in enumerate(candidates):
+            for f, (train, test) in enumerate(folds):
+                forest = clone(self.estimator).set_params(n_estimators=self.max_trees, n_jobs=self.n_jobs, **params)
+                forest.fit(X[train], y[train])
+                scores[c, f] = self._staged_accuracy(forest, X[test], y[test])
+
+        mean, std = scores.mean(axis=1), scores.std(axis=1)
+        c, k = np.unravel_index(np.argmax(mean), mean.shape)
+        self.best_params_ = dict(candidates[c], n_estimators=int(k) + 1)
+        self.best_score_ = mean[c, k]
+        self.best_index_ = int(c * self.max_trees + k)
+        self.cv_results_ = {'params': [dict(p, n_estimators=n) for p in candidates for n in range(1, self.max_trees + 1)],
+                            'mean_test_score': mean.ravel(),
+                            'std_test_score': std.ravel()}
+
+        self.best_estimator_ = clone(self.estimator).set_params(n_jobs=self.n_jobs, **self.best_params_)
+        # refit on the data as given, so the estimator keeps its feature names
+        self.best_estimator_.fit(data, y)
+        self.classes_ = self.best_estimator_.classes_
+        return self
+
+    def predict(self, X):
+        """
+        Predicts with the best forest.
+
+        Args:
+            X (array-like): features.
+
+        Returns:
+            y_pred (numpy.ndarray): predicted labels.
+        """
+        check_is_fitted(self, 'best_estimator_')
+        return self.best_estimator_.predict(X)
+
+    def predict_proba(self, X):
+        """
+        Predicts class probabilities with the best forest.
+
+        Args:
+            X (array-like): features.
+
+        Returns:
+            proba (numpy.ndarray): class probabilities, columns ordered as classes_.
+        """
+        check_is_fitted(self, 'best_estimator_')
+        return self.best_estimator_.predict_proba(X)
+
+    @staticmethod
+    def _staged_accuracy(forest, X, y):
+        # accuracy of the forests made of the first 1..n trees, averaging tree
+        # probabilities as RandomForestClassifier.predict does
+        target = np.searchsorted(forest.classes_, y)
+        proba = np.zeros((len(X), len(forest.classes_)))
+        accuracy = np.empty(len(forest.estimators_))
+        for n, estimator in enumerate(forest.estimators_):
+            proba += estimator.predict_proba(X)
+            accuracy[n] = np.mean(proba.argmax(axis=1) == target)
+        return accuracy
+
+
+class NeighborGraphKNNSearch(ClassifierMixin, BaseEstimator):
+    """
+    KNN search over every n_neighbors in 1..max_neighbors and every weighting.
+    Since the k nearest neighbors of a point are the first k of its max_neighbors
+    nearest neighbors, the max_neighbors neighbor graph of the held out points of
+    each CV fold is queried once from a KD tree of the training part, and the
+    votes of the neighbors are accumulated in distance order so the prediction
+    of every (n_neighbors, weights) candidate comes from that one query. The
+    best candidate is refit on all data.
+
+    Args:
+        estimator (sklearn.neighbors.KNeighborsClassifier): classifier to tune.
+        max_neighbors (int): largest n_neighbors evaluated. Default 127.
+        weights (list): weightings evaluated. Default ['uniform', 'distance'].
+        cv (int): number of stratified folds. Default 5.
+        n_jobs (int): parallel jobs of the neighbor queries. Default None.
+        batch_size (int): held out points scored at a time, bounding the memory
+            of the vote accumulation. Default 10000.
+    """
+
+    def __init__(self, estimator, max_neighbors = 127, weights = ('uniform', 'distance'), cv = 5,
+                 n_jobs = None, batch_size = 10000):
+        self.estimator = estimator
+        self.max_neighbors = max_neighbors
+        self.weights = weights
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.batch_size = batch_size
+
+    def fit(self, X, y):
+        """
+        Runs the search and refits the best classifier on X, y.
+
+        Args:
+            X (array-like): training features.
+            y (array-like): training labels.
+
+        Returns:
+            self (NeighborGraphKNNSearch): fitted search.
+        """
+        data = X
+        X, y = np.asarray(X), np.asarray(y)
+        classes, target = np.unique(y, return_inverse=True)
+        folds = list(StratifiedKFold(self.cv).split(X, y))
+
+        # held out accuracy of every weighting, fold and n_neighbors
+        scores = np.zeros((len(self.weights), len(folds), self.max_neighbors))
+        for f, (train, test) in enumerate(folds):
+            k_max = min(self.max_neighbors, len(train))
+            graph = NearestNeighbors(n_neighbors=k_max, algorithm='kd_tree', n_jobs=self.n_jobs).fit(X[train])
+            for start in range(0, len(test), self.batch_size):
+                rows = test[start:start + self.batch_size]
+                dist, ind = graph.kneighbors(X[rows])
+                votes = np.eye(len(classes))[target[train][ind]]
+                for w, weights in enumerate(self.weights):
+                    weighted = votes * self._vote_weights(dist, weights)[:, :, None]
+                    predicted = np.cumsum(weighted, axis=1).argmax(axis=2)
+                    scores[w, f, :k_max] += (predicted == target[rows][:, None]).sum(axis=0)
+            scores[:, f] /= len(test)
+            scores[:, f, k_max:] = np.nan
+
+        mean, std = scores.mean(axis=1), scores.std(axis=1)
+        w, k = np.unravel_index(np.nanargmax(mean), mean.shape)
+        self.best_params_ = {'n_neighbors': int(k) + 1, 'weights': self.weights[w]}
+        self.best_score_ = mean[w, k]
+        self.best_index_ = int(w * self.max_neighbors + k)
+        self.cv_results_ = {'params': [{'n_neighbors': n, 'weights': weights} for weights in self.weights
+                                       for n in range(1, self.max_neighbors + 1)],
+                            'mean_test_score': mean.ravel(),
+                            'std_test_score': std.ravel()}
+
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_)
+        # refit on the data as given, so the estimator keeps its feature names
+        self.best_estimator_.fit(data, y)
+        self.classes_ = self.best_estimator_.classes_
+        return self
+
+    def predict(self, X):
+        """
+        Predicts with the best classifier.
+
+        Args:
+            X (array-like): features.
+
+        Returns:
+            y_pred (numpy.ndarray): predicted labels.
+        """
+        check_is_fitted(self, 'best_estimator_')
+        return self.best_estimator_.predict(X)
+
+    def predict_proba(self, X):
+        """
+        Predicts class probabilities with the best classifier.
+
+        Args:
+            X (array-like): features.
+
+        Returns:
+            proba (numpy.ndarray): class probabilities, columns ordered as classes_.
+        """
+        check_is_fitted(self, 'best_estimator_')
+        return self.best_estimator_.predict_proba(X)
+
+    @staticmethod
+    def _vote_weights(dist, weights):
+        # neighbor weights as KNeighborsClassifier computes them: inverse distance,
+        # except that points at zero distance of a training point only count those
+        if weights == 'uniform':
+            return np.ones_like(dist)
+        with np.errstate(divide='ignore'):
+            inverse = 1. / dist
+        exact = dist[:, 0] == 0
+        inverse[exact] = dist[exact] == 0
+        return inverse
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Online classification of flows with a model saved by ML.py or scheduler.py and the
+scaler saved by split_scale_data.py. Requests are queued to a micro-batcher, which
+gathers the flows of concurrent requests into one batch (up to a maximum size or
+waiting time) so the BLINC features, scaling and prediction run as one vectorized
+call per batch. Used by inference_server.py and benchmark_inference.py, and by
+score.py to classify flow files in bulk.
+'''
+
+import json
+import time
+import queue
+import socket
+import pickle
+import threading
+import http.client
+import socketserver
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import experiments
+import feature_engineering_function
+
+# latencies kept for the percentiles of the metrics
+LATENCY_WINDOW = 100000
+
+# flow fields holding addresses rather than numbers
+ADDRESS_FIELDS = ['srcaddr', 'dstaddr']
+
+# classifiers loaded by this process, kept for the chunks scored by score.py workers
+_classifiers = {}
+
+
+class FlowClassifier:
+    """
+    Classifies batches of flow records: attaches the BLINC counts of the time
+    window of each flow, standardizes the features of the model's feature subset
+    with the saved scaler and predicts their class. Without a window, the flows
+    must already carry their BLINC counts, as engineered_features.py writes them.
+
+    Args:
+        model_file (str): model saved by experiments.save_model, or
+            .npz file of a tree model exported by export_trees.py.
+        scaler_file (str): pickled StandardScaler from split_scale_data.py.
+        features (list): feature subset the model was trained on.
+        window (int): length of the BLINC count windows, in flow timestamp units. Default None.
+        step (int): slide of the windows. Default None (tumbling windows).
+        error (float): relative standard error of approximate counts. Default None counts exactly.
+        model: classifier already loaded from model_file. Default None loads it.
+    """
+
+    def __init__(self, model_file, scaler_file, features, window = None, step = None, error = None, model = None):
+        self.model = experiments.load_model(model_file)[0] if model is None else model
+        with open(scaler_file, 'rb') as f:
+            scaler = pickle.load(f)
+        scaled = list(scaler.feature_names_in_)
+        columns = [scaled.index(f) for f in features]
+        self.mean, self.scale = scaler.mean_[columns], scaler.scale_[columns]
+        self.features = features
+
+        # flow fields every record needs
+        blinc = [f for f in features if f in feature_engineering_function.BLINC_COLUMNS]
+        self.window = None
+        self.fields = list(features)
+        if window and blinc:
+            self.window = feature_engineering_function.BLINCWindow(window, step, error=error)
+            self.fields = ([f for f in features if f not in blinc] + [self.window.timestamp, 'srcaddr']
+                           + list(feature_engineering_function.BLINC_SOURCES.values()))
+
+    def validate(self, records):
+        """
+        Checks the flows of one request, so that a bad request is rejected on its
+        own instead of failing the batch it would be predicted with. The checks
+        run on the decoded JSON values, which is cheaper than building a frame for
+        every request.
+
+        Args:
+            records (list): flow records as dicts of flow fields.
+
+        Returns:
+            records (list): the checked records.
+
+        Raises:
+            ValueError: if a record misses a flow field or holds a missing or
+                non-numeric value in one.
+        """
+        missing = {f for r in records for f in self.fields if f not in r}
+        if missing:
+            raise ValueError(f'missing flow fields {sorted(missing)}')
+        invalid = set()
+        for r in records:
+            for field in self.fields:
+                value = r[field]
+                if field in ADDRESS_FIELDS:
+                    valid = isinstance(value, str)
+                else:
+                    # NaN is the only value not equal to itself
+                    valid = isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+                if not valid:
+                    invalid.add(field)
+        if invalid:
+            raise ValueError(f'missing or non-numeric values in flow fields {sorted(invalid)}')
+        return records
+
+    def transform(self, records):
+        """
+        Computes the standardized model features of a batch of flows.
+
+        Args:
+            records (list or pandas.DataFrame): flow records as dicts of flow fields, or a frame of flows.
+
+        Returns:
+            X (pandas.DataFrame): model features.
+        """
+        df = records if isinstance(records, pd.DataFrame) else pd.DataFrame.from_records(records)
+        if self.window is None:
+            X = df[self.features].to_numpy(dtype=np.float64, copy=True)
+        else:
+            # window counts go straight into their feature columns
+            counts = self.window.count(df)
+            X = np.empty((len(df), len(self.features)))
+            for j, feature in enumerate(self.features):
+                if feature in feature_engineering_function.BLINC_COLUMNS:
+                    X[:, j] = counts[:, feature_engineering_function.BLINC_COLUMNS.index(feature)]
+                else:
+                    X[:, j] = df[feature].to_numpy(dtype=np.float64)
+        # same arithmetic as StandardScaler.transform, on the subset's columns only
+        X -= self.mean
+        X /= self.scale
+        return pd.DataFrame(X, columns=self.features)
+
+    def predict(self, records):
+        """
+        Classifies a batch of flows.
+
+        Args:
+            records (list or pandas.DataFrame): flow records as dicts of flow fields, or a frame of flows.
+
+        Returns:
+            y_pred (numpy.ndarray): predicted class of each flow.
+        """
+        return self.model.predict(self.transform(records))
+
+    def score(self, chunk, keep, proba = False):
+        """
+        Classifies a chunk of flows carrying their BLINC counts, for score.py.
+
+        Args:
+            chunk (pandas.DataFrame): flows.
+            keep (list): flow columns copied to the result.
+            proba (bool): add the probability of every class. Default False.
+
+        Returns:
+            scored (pandas.DataFrame): kept columns, predicted class and class probabilities.
+        """
+        X = self.transform(chunk)
+        scored = chunk[keep].reset_index(drop=True)
+        scored['predicted'] = self.model.predict(X)
+        if proba:
+            probabilities = self.model.predict_proba(X)
+            for c, label in enumerate(self.model.classes_):
+                scored[f'proba_{label}'] = probabilities[:, c]
+        return scored
+
+
+def score_chunk(model_file, scaler_file, features, chunk, keep, proba = False):
+    """
+    Classifies a chunk of flows carrying their BLINC counts in a score.py worker
+    process. The classifier is loaded once per process and reused by its later chunks.
+
+    Args:
+        model_file (str): model file, see FlowClassifier.
+        scaler_file (str): pickled StandardScaler from split_scale_data.py.
+        features (list): feature subset the model was trained on.
+        chunk (pandas.DataFrame): flows.
+        keep (list): flow columns copied to the result.
+        proba (bool): add the probability of every class. Default False.
+
+    Returns:
+        scored (pandas.DataFrame): kept columns, predicted class and class probabilities.
+    """
+    key = (model_file, scaler_file, tuple(features))
+    if key not in _classifiers:
+        _classifiers[key] = FlowClassifier(model_file, scaler_file, features)
+    return _classifiers[key].score(chunk, keep, proba)
+
+
+class LatencyStats:
+    """
+    Thread safe request latency and throughput counters.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.start = time.perf_counter()
+        self.requests = self.flows = self.batches = 0
+
+    def record(self, latencies, flows):
+        """
+        Records one processed batch.
+
+        Args:
+            latencies (list): seconds from arrival to completion of each request in the batch.
+            flows (int): number of flows in the batch.
+        """
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.requests += len(latencies)
+            self.flows += flows
+            self.batches += 1
+
+    def snapshot(self):
+        """
+        Summarizes the counters.
+
+        Returns:
+            metrics (dict): request latency percentiles in milliseconds, counts and throughput.
+        """
+        with self.lock:
+            latencies = np.array(self.latencies)
+            elapsed = time.perf_counter() - self.start
+            metrics = {'requests': self.requests, 'flows': self.flows, 'batches': self.batches,
+                       'mean_batch_flows': self.flows / self.batches if self.batches else 0.,
+                       'flows_per_second': self.flows / elapsed,
+                       'requests_per_second': self.requests / elapsed}
+        if len(latencies):
+            metrics['p50_ms'], metrics['p99_ms'] = np.percentile(latencies, [50, 99]) * 1000
+        return metrics
+
+
+class MicroBatcher:
+    """
+    Gathers the flows of concurrent requests into batches for a single worker
+    thread. A batch is closed once it holds max_batch flows or max_wait seconds
+    passed since its first request arrived. If the prediction of a batch of several
+    requests fails, its requests are predicted one by one, so only the request at
+    fault gets the error.
+
+    Args:
+        predict (callable): batch prediction, from a list of records to one result per record.
+        max_batch (int): largest number of flows per batch. Default 512.
+        max_wait (float): longest wait in seconds for a batch to fill. Default 0.002.
+    """
+
+    def __init__(self, predict, max_batch = 512, max_wait = 0.002):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = LatencyStats()
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, records):
+        """
+        Queues the flows of a request and waits for their predictions.
+
+        Args:
+            records (list): flow records.
+
+        Returns:
+            y_pred (list): predicted class of each flow.
+        """
+        request = {'records': records, 'arrival': time.perf_counter(), 'done': threading.Event()}
+        self.queue.put(request)
+        request['done'].wait()
+        if 'error' in request:
+            raise request['error']
+        return request['result']
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            flows = len(batch[0]['records'])
+            deadline = batch[0]['arrival'] + self.max_wait
+            while flows < self.max_batch:
+                try:
+                    request = self.queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                batch.append(request)
+                flows += len(request['records'])
+            self._process(batch, flows)
+
+    def _process(self, batch, flows):
+        try:
+            y_pred = self.predict([r for request in batch for r in request['records']]).tolist()
+        except Exception as e:
+            if len(batch) > 1:
+                for request in batch:
+                    self._process([request], len(request['records']))
+                return
+            batch[0]['error'] = e
+            batch[0]['done'].set()
+            return
+        start = 0
+        for request in batch:
+            request['result'] = y_pred[start:start + len(request['records'])]
+            start += len(request['records'])
+            request['done'].set()
+        now = time.perf_counter()
+        self.stats.record([now - request['arrival'] for request in batch], flows)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # POST /predict with a JSON list of flow records, GET /metrics
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if self.path != '/predict':
+            return self._reply(404, {'error': f'unknown path {self.path}'})
+        try:
+            records = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        except (TypeError, ValueError) as e:
+            return self._reply(400, {'error': f'invalid request: {e}'})
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            return self._reply(400, {'error': 'expected a flow record or a list of flow records'})
+        if not records:
+            return self._reply(200, {'class': []})
+        # reject invalid flows here, before they are batched with other requests
+        try:
+            records = self.server.validate(records)
+        except ValueError as e:
+            return self._reply(400, {'error': str(e)})
+        try:
+            self._reply(200, {'class': self.server.batcher.submit(records)})
+        except Exception as e:
+            self._reply(500, {'error': str(e)})
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            return self._reply(404, {'error': f'unknown path {self.path}'})
+        self._reply(200, self.server.batcher.stats.snapshot())
+
+    def _reply(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(batcher, validate, port = None, socket_path = None):
+    """
+    Creates the HTTP server answering the requests of a micro-batcher, on a local
+    TCP port or a Unix socket.
+
+    Args:
+        batcher (MicroBatcher): batcher the requests are submitted to.
+        validate (callable): check of the records of a request, returning them and
+            raising ValueError for invalid records (FlowClassifier.validate).
+        port (int): TCP port on localhost. Default None.
+        socket_path (str): Unix socket path, used instead of port. Default None.
+
+    Returns:
+        server (socketserver.BaseServer): server, to run with serve_forever().
+    """
+    if socket_path:
+        server = _UnixHTTPServer(socket_path, _Handler)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+    server.batcher = batcher
+    server.validate = validate
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP client connection over a Unix socket.
+
+    Args:
+        socket_path (str): Unix socket path of the server.
+    """
+
+    def __init__(self, socket_path):
+        super().__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
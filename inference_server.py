@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Serves a model saved by ML.py (feature_subset_ml.joblib), or a tree model exported
+by export_trees.py (.npz), over HTTP on a local TCP port or Unix socket. Flows
+posted to /predict as a JSON list of flow records are checked, micro-batched with
+the flows of concurrent requests, standardized with the scaler.pkl of
+split_scale_data.py and classified; the response holds their classes, or status
+400 for a request with missing or non-numeric flow fields. GET /metrics returns the
+p50/p99 request latency, batch sizes and throughput (see inference.py).
+
+By default the records carry the features of the model's feature subset, BLINC
+counts included, computed as for training by engineered_features.py over the
+whole capture. With --window the records are raw flows (srcaddr, dstaddr, srcport,
+dstport, first, duration, dPkts, dOctets) whose BLINC counts are taken over time
+windows of that length instead; these differ from the whole capture counts the
+model was trained on, so the window should match how the training data was
+engineered (engineered_features.py --window).
+
+Usage: inference_server.py model.joblib|model.npz scaler.pkl feature_subset_# [--port P | --socket PATH]
+                           [--max-batch N] [--max-wait MS] [--window SIZE [--step STEP]] [--error E]
+'''
+
+import os
+import sys
+import signal
+import argparse
+import experiments
+import inference
+import timing
+
+parser = argparse.ArgumentParser(usage='inference_server.py model.joblib|model.npz scaler.pkl feature_subset_# [--port P | --socket PATH] [--max-batch N] [--max-wait MS] [--window SIZE [--step STEP]] [--error E]')
+parser.add_argument('model')
+parser.add_argument('scaler')
+parser.add_argument('subset', type=int)
+parser.add_argument('--port', type=int, default=8080)
+parser.add_argument('--socket', default=None,
+                    help='listen on this Unix socket instead of the TCP port')
+parser.add_argument('--max-batch', type=int, default=512,
+                    help='largest number of flows predicted per batch')
+parser.add_argument('--max-wait', type=float, default=2.,
+                    help='longest wait in milliseconds for a batch to fill')
+parser.add_argument('--window', type=int, default=None,
+                    help='count BLINC features over time windows of this length, in flow timestamp units, '
+                         'instead of taking them from the records')
+parser.add_argument('--step', type=int, default=None,
+                    help='slide the windows by this much instead of tumbling them')
+parser.add_argument('--error', type=float, default=None,
+                    help='approximate distinct counts with this relative standard error')
+args = parser.parse_args()
+timing.start()
+
+features = experiments.COMBINATIONS[args.subset][0]
+with timing.stage('load'):
+    classifier = inference.FlowClassifier(args.model, args.scaler, features, args.window, args.step, args.error)
+batcher = inference.MicroBatcher(classifier.predict, args.max_batch, args.max_wait / 1000)
+
+if args.socket and os.path.exists(args.socket):
+    os.remove(args.socket)
+server = inference.make_server(batcher, classifier.validate, args.port, args.socket)
+# shut down cleanly, removing the socket, when terminated
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+print(f'serving {args.model} on {args.socket or "127.0.0.1:" + str(args.port)}', flush=True)
+with timing.stage('serve') as stage:
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        if args.socket:
+            os.remove(args.socket)
+    stage['rows'] = batcher.stats.flows
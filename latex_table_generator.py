@@ -7,41 +7,43 @@ Created on Thu Mar 12 10:46:45 2020
 """
 
 '''
-Creates LaTeX table code for each machine learning algorithm. Output text files saved
-to specified location.
+Creates LaTeX table code for each machine learning algorithm from the precision and
+recall of every feature subset and test set in the results store of the ML.py
+results directory (see results_store.py). Output text files saved to specified
+location.
 
-Usage: python3 latex_table_generator.py #ofTests path/to/reports/ path/to/save/latex/files/
+Usage: python3 latex_table_generator.py #ofTests path/to/ML.py/results/ path/to/save/latex/files/
 '''
 
-import pandas as pd
-import numpy as np
-from scipy.stats import t
 import sys
+import results_store
+import timing
 
-if len(sys.argv) < 3:
-    print('Usage: python3 latex_table_generator.py #ofTests path/to/reports/ path/to/save/latex/files/')
-	exit()
+if len(sys.argv) < 4:
+    print('Usage: python3 latex_table_generator.py #ofTests path/to/ML.py/results/ path/to/save/latex/files/')
+    exit()
 
 noOfTests = int(sys.argv[1])
-report_path = sys.argv[2]
+results_path = sys.argv[2]
 tables_path = sys.argv[3]
+timing.start()
 
-# read report files for each ml algorithm
-df_dict = {'knn' : pd.read_csv(report_path+'precision_recall_knn_experiments.csv'),
-           'dt' : pd.read_csv(report_path+'precision_recall_dt_experiments.csv'),
-           'rf' : pd.read_csv(report_path+'precision_recall_rf_experiments.csv')}
+# read precision and recall of each ml algorithm from the results store
+with timing.stage('query'):
+    df_dict = {ml: results_store.precision_recall(results_path, ml, noOfTests) for ml in ['knn','dt','rf']}
+
+# mean and 99.9% error interval for precision and recall, shared with ci_viz.py
+with timing.stage('confidence intervals'):
+    intervals = results_store.confidence_intervals(results_path, noOfTests)
 
 # generate LaTeX code and save in text file
 for ml in ['knn','dt','rf']:
-    precision = df_dict[ml][[f'test{x} precision' for x in range(1,noOfTests+1)]]
-    recall = df_dict[ml][[f'test{x} recall' for x in range(1,noOfTests+1)]]
-    
-    # calculate mean and 99.9% error interval for precision and recall
-    df_dict[ml]['precision mean'] = precision.mean(axis = 1)
-    df_dict[ml]['precision error'] = t.ppf(.999, noOfTests-1) * ( precision.std(axis = 1) / np.sqrt(noOfTests))
-    df_dict[ml]['recall mean'] = recall.mean(axis = 1)
-    df_dict[ml]['recall error'] = t.ppf(.999, noOfTests-1) * ( recall.std(axis = 1) / np.sqrt(noOfTests))
-    
+    ci = intervals[intervals['ml'] == ml].pivot(index='features', columns='metric', values=['mean','error'])
+    ci = ci.reindex(df_dict[ml]['features'])
+    for metric in ['precision','recall']:
+        df_dict[ml][metric+' mean'] = ci[('mean', metric)].to_numpy()
+        df_dict[ml][metric+' error'] = ci[('error', metric)].to_numpy()
+
     # LaTeX code generation
     head = '\\begin{table}[htpb]\n\centering\n\\resizebox{\\textwidth}{!}{%\n'
     table = '\\begin{tabular}{l'+'c'*(noOfTests*2)+'cc}\n\cline{2-'+str(noOfTests*2+3)+'}\n'
@@ -55,7 +57,7 @@ for ml in ['knn','dt','rf']:
     
     body = ''
     for i in range(df_dict[ml].shape[0]):
-        line = f'{df_dict["knn"]["features"][i]}'
+        line = f'{df_dict[ml]["features"][i]}'
         for testNo in range(1,noOfTests+1):
             line += ' & '+format(df_dict[ml][f"test{testNo} precision"][i],'.4f')+' & '+format(df_dict[ml][f"test{testNo} recall"][i],'.4f')
         line += ' & '+format(df_dict[ml]["precision mean"][i],'.4f')+' $\pm$ '+format(df_dict[ml]["precision error"][i],'.4f')+' & '+format(df_dict[ml]["recall mean"][i],'.4f')+' $\pm$ '+format(df_dict[ml]["recall error"][i],'.4f')+' \\\\ \hline \n'
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Runs class labeling (class_labels.py) and feature engineering (engineered_features.py)
+as one streaming job over the raw nDPI labelled flow export, without writing or
+re-parsing the intermediate labelled file. Zero duration flows are dropped, the class
+of every flow is attached and the BLINC features are appended before the flows are
+written to savefile.
+
+The BLINC counts of a source address depend on all of its flows, so the export is
+read twice: a first pass loads only the address and port columns to accumulate the
+counts, the second pass labels and writes the full flows. With --window the counts
+are taken over time windows instead, which needs a single pass.
+
+Usage: pipeline.py rawfile savefile [--map class_map.csv] [--chunksize N] [--error E]
+                   [--window SIZE [--step STEP]]
+'''
+
+import argparse
+import storage
+import class_mapping
+import feature_engineering_function
+import timing
+
+# Check for command line arguments
+parser = argparse.ArgumentParser(usage='pipeline.py rawfile savefile [--map class_map.csv] [--chunksize N] [--error E] [--window SIZE [--step STEP]]')
+parser.add_argument('file')
+parser.add_argument('savefile')
+parser.add_argument('--map', default=class_mapping.CLASS_MAP_FILE,
+                    help='csv table of app to class mappings')
+parser.add_argument('--chunksize', type=int, default=1000000,
+                    help='number of flows read per chunk')
+parser.add_argument('--error', type=float, default=None,
+                    help='approximate distinct counts with this relative standard error')
+parser.add_argument('--window', type=int, default=None,
+                    help='count over time windows of this length, in flow timestamp units')
+parser.add_argument('--step', type=int, default=None,
+                    help='slide the windows by this much instead of tumbling them')
+args = parser.parse_args()
+timing.start()
+
+class_map = class_mapping.load_class_map(args.map)
+
+
+def flows(columns = None):
+    # chunks of the export without zero duration flows
+    for chunk in storage.iter_table(args.file, args.chunksize, columns=columns):
+        yield chunk[chunk.duration > 0]
+
+
+if args.window:
+    window = feature_engineering_function.BLINCWindow(args.window, args.step, error=args.error)
+    features = window.update
+else:
+    # first pass: BLINC counts from the address and port columns only
+    columns = ['duration', 'srcaddr'] + list(feature_engineering_function.BLINC_SOURCES.values())
+    acc = None
+    with timing.stage('BLINC counts', 0) as stage:
+        for chunk in flows(columns):
+            acc = feature_engineering_function.BLINC_accumulate(chunk, acc, args.error)
+            stage['rows'] += len(chunk)
+        featuresdf = feature_engineering_function.BLINC_accumulated_counts(acc, args.error)
+    features = lambda chunk: feature_engineering_function.BLINC_attach(chunk, featuresdf)
+
+# label, add features and write every chunk (the second pass unless windowed)
+with storage.TableWriter(args.savefile) as writer, timing.stage('label, features and write', 0) as stage:
+    for chunk in class_mapping.label_chunks(flows(), class_map):
+        writer.write(features(chunk))
+        stage['rows'] += len(chunk)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Keeps the evaluation results of all experiments in one SQLite database in the
+results directory (results.sqlite), indexed by (feature subset, algorithm, test set,
+class), the feature subset being named by its features, so report.py, latex_table_generator.py, ci_viz.py and
+class_breakdown_boxplots.py read all experiments with one query. ML.py and
+scheduler.py add the results of every evaluated model next to the results file of
+the run (see evaluation.py); results of a later run replace those of the same
+experiment. A results directory without a store is loaded from its results files
+when first queried. The confidence intervals of the reports are computed once and
+kept in the store until results are added.
+'''
+
+import os
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from scipy.stats import t
+import experiments
+import evaluation
+
+# database file in the results directory
+STORE_FILE = 'results.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scores (
+    subset INTEGER, features TEXT, ml TEXT, test INTEGER, class TEXT,
+    precision REAL, recall REAL, f1 REAL, support REAL,
+    PRIMARY KEY (features, ml, test, class));
+CREATE INDEX IF NOT EXISTS scores_class ON scores (class, ml);
+CREATE TABLE IF NOT EXISTS evaluations (
+    subset INTEGER, features TEXT, ml TEXT, test INTEGER,
+    accuracy REAL, cv_score REAL, params TEXT, labels TEXT, confusion_matrix TEXT,
+    PRIMARY KEY (features, ml, test));
+CREATE TABLE IF NOT EXISTS intervals (
+    tests INTEGER, position INTEGER, ml TEXT, features TEXT, metric TEXT, mean REAL, error REAL,
+    PRIMARY KEY (tests, ml, features, metric));
+'''
+
+# rows of the averages in the scores table, besides those of the class labels
+AVERAGES = ['macro avg', 'weighted avg']
+# algorithms of the reports, in report order
+ALGORITHMS = ['knn', 'dt', 'rf']
+# one sided t confidence of the error intervals across test sets
+CONFIDENCE = .999
+
+
+def subset_number(features):
+    """
+    Finds the feature subset of a feature list.
+
+    Args:
+        features (list): feature names.
+
+    Returns:
+        subset (int): subset number of experiments.COMBINATIONS, None if not one of them.
+    """
+    for subset, combos in experiments.COMBINATIONS.items():
+        if list(features) in combos:
+            return subset
+    return None
+
+
+def subset_label(features):
+    """
+    Gives the display name of a feature set in reports: the base features, or
+    the engineered features added to them.
+
+    Args:
+        features (str): experiment name of the feature set (see experiments.experiment_name).
+
+    Returns:
+        label (str): 'duration, dPkts, dOctets' or e.g. '+ (dstaddrcount, srcportcount)'.
+    """
+    base = experiments.experiment_name(experiments.COMBINATIONS[0][0])
+    if features == base:
+        return features.replace('_', ', ')
+    return '+ (' + features[len(base)+1:].replace('_', ', ') + ')'
+
+
+def connect(results_path):
+    """
+    Opens the store of a results directory, creating it if needed.
+
+    Args:
+        results_path (str): results directory.
+
+    Returns:
+        connection (sqlite3.Connection): open database connection.
+    """
+    connection = sqlite3.connect(os.path.join(results_path, STORE_FILE))
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def save(results, results_path):
+    """
+    Adds evaluation results to the store, replacing earlier results of the same
+    experiments.
+
+    Args:
+        results (list): result dicts of evaluation.evaluate, with their features and ml.
+        results_path (str): results directory.
+    """
+    scores, evaluations = [], []
+    for r in results:
+        key = (subset_number(r['features']), experiments.experiment_name(r['features']), r['ml'], r['test'])
+        evaluations.append(key + (r['accuracy'], r.get('cv_score'), json.dumps(r.get('params'), default=int),
+                                  json.dumps(r['labels']), json.dumps(r['confusion_matrix'])))
+        scores += [key + (label, s['precision'], s['recall'], s['f1-score'], s['support'])
+                   for label, s in r['report'].items() if label != 'accuracy']
+    with connect(results_path) as connection:
+        connection.execute('DELETE FROM intervals')
+        connection.executemany('INSERT OR REPLACE INTO evaluations VALUES (?,?,?,?,?,?,?,?,?)', evaluations)
+        connection.executemany('INSERT OR REPLACE INTO scores VALUES (?,?,?,?,?,?,?,?,?)', scores)
+    connection.close()
+
+
+def query(results_path, sql, params = ()):
+    """
+    Runs a query on the store of a results directory. A directory holding results
+    files but no store yet is loaded into a new store first.
+
+    Args:
+        results_path (str): results directory.
+        sql (str): SELECT statement.
+        params (tuple): query parameters. Default ().
+
+    Returns:
+        df (pandas.DataFrame): query result.
+    """
+    if not os.path.exists(os.path.join(results_path, STORE_FILE)):
+        save(evaluation.read_results(results_path), results_path)
+    connection = connect(results_path)
+    try:
+        return pd.read_sql_query(sql, connection, params=params)
+    finally:
+        connection.close()
+
+
+def scores(results_path, ml = None, averages = False):
+    """
+    Reads the precision, recall, F1-score and support of every class (or of the
+    averages) of every experiment and test set.
+
+    Args:
+        results_path (str): results directory.
+        ml (str): algorithm key to read. Default None, all algorithms.
+        averages (bool): read the macro and weighted averages instead of the
+            classes. Default False.
+
+    Returns:
+        df (pandas.DataFrame): subset, features, ml, test, class, precision,
+            recall, f1 and support columns, ordered by subset, ml, test and class.
+    """
+    sql = ('SELECT * FROM scores WHERE class ' + ('' if averages else 'NOT ') + 'IN (?, ?)'
+           + ('' if ml is None else ' AND ml = ?') + ' ORDER BY subset, features, ml, test, class')
+    return query(results_path, sql, tuple(AVERAGES) + (() if ml is None else (ml,)))
+
+
+def precision_recall(results_path, ml, no_tests):
+    """
+    Tabulates the weighted average precision and recall of every feature subset
+    and test set of an algorithm, truncated to 4 decimals, as saved by report.py.
+
+    Args:
+        results_path (str): results directory.
+        ml (str): algorithm key.
+        no_tests (int): number of test sets.
+
+    Returns:
+        df (pandas.DataFrame): features column (display name) followed by
+            'test# precision' and 'test# recall' columns of every test set, one
+            row per feature subset in subset order.
+    """
+    df = scores(results_path, ml, averages=True)
+    df = df[(df['class'] == 'weighted avg') & (df['test'] <= no_tests)]
+    table = df.pivot(index=['subset', 'features'], columns='test', values=['precision', 'recall'])
+    table = np.trunc(table * 10**4) / 10**4
+    table.columns = [f'test{test} {metric}' for metric, test in table.columns]
+    table = table[[f'test{i} {metric}' for i in range(1, no_tests+1) for metric in ['precision', 'recall']]]
+    table = table.reset_index(level='subset', drop=True).reset_index()
+    table['features'] = table['features'].map(subset_label)
+    return table
+
+
+def confidence_intervals(results_path, no_tests):
+    """
+    Computes the mean and t based error interval (CONFIDENCE) of the weighted
+    average precision and recall of every algorithm and feature subset across the
+    test sets, from the tables of precision_recall melted into one long table and
+    aggregated with one groupby. The intervals are kept in the store, so the
+    tables of latex_table_generator.py and the plots of ci_viz.py show the same
+    intervals without recomputing them.
+
+    Args:
+        results_path (str): results directory.
+        no_tests (int): number of test sets.
+
+    Returns:
+        df (pandas.DataFrame): ml, features (display name), metric ('precision'
+            or 'recall'), mean and error columns, in report order.
+    """
+    sql = 'SELECT ml, features, metric, mean, error FROM intervals WHERE tests = ? ORDER BY position'
+    cached = query(results_path, sql, (no_tests,))
+    if len(cached):
+        return cached
+
+    long = pd.concat([precision_recall(results_path, ml, no_tests).assign(ml=ml) for ml in ALGORITHMS])
+    long = long.melt(id_vars=['ml', 'features'], var_name='column', value_name='score')
+    long['metric'] = long['column'].str.split(' ').str[1]
+    stats = long.groupby(['ml', 'features', 'metric'], sort=False)['score'].agg(['mean', 'std', 'count'])
+    stats['error'] = t.ppf(CONFIDENCE, stats['count'] - 1) * stats['std'] / np.sqrt(stats['count'])
+    intervals = stats.reset_index()[['ml', 'features', 'metric', 'mean', 'error']]
+
+    with connect(results_path) as connection:
+        connection.executemany('INSERT OR REPLACE INTO intervals VALUES (?,?,?,?,?,?,?)',
+                               [(no_tests, position) + tuple(row)
+                                for position, row in enumerate(intervals.itertuples(index=False))])
+    connection.close()
+    return intervals
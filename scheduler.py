@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Runs the ML.py experiments of the given feature subsets as one job graph on a single
+bounded process pool. Every (feature subset, algorithm, hyper-parameter candidate, CV
+fold) fit is a task, and the refit and test set evaluation of a (feature subset,
+algorithm) pair is a task that is queued as soon as all of its fold tasks completed.
+All tasks share a global budget of single threaded worker processes (--cores) instead
+of every search grabbing all cores. Candidates are sampled with a fixed seed, and each
+completed task is recorded in scheduler_journal.jsonl in the results directory, keyed
+by the version (file sizes and modification times) of the data sets, so rerunning the
+same command after a crash only runs the tasks that did not complete, and a rerun on
+regenerated data sets runs them all again.
+Models and results are saved to the same files as ML.py, the results of a rerun
+to a results file of its own. The time of the job graph is appended to the timing
+report of the run (see timing.py), with the completed tasks as rows.
+
+Usage: scheduler.py feature_subset_#|all #_of_test_files path/to/data/dir/ path/to/results/dir/ [--cores N] [--seed S] [--compress L]
+'''
+
+import os
+import json
+import argparse
+from concurrent.futures import wait, FIRST_COMPLETED
+from joblib.externals.loky import get_reusable_executor
+from sklearn.model_selection import ParameterSampler
+import experiments
+import evaluation
+import results_store
+import timing
+
+parser = argparse.ArgumentParser(usage='scheduler.py feature_subset_#|all #_of_test_files path/to/data/dir/ path/to/results/dir/ [--cores N] [--seed S] [--compress L]')
+parser.add_argument('subsets')
+parser.add_argument('no_test_files', type=int)
+parser.add_argument('data_path')
+parser.add_argument('results_path')
+parser.add_argument('--cores', type=int, default=os.cpu_count(),
+                    help='number of worker processes shared by all tasks')
+parser.add_argument('--seed', type=int, default=0,
+                    help='seed of the hyper-parameter candidate sampling')
+parser.add_argument('--compress', type=int, default=0,
+                    help='joblib compression level of the saved models')
+args = parser.parse_args()
+timing.start()
+
+combos = experiments.feature_combos(args.subsets)
+columns = sorted({f for features in combos for f in features}) + ['class']
+data = (args.data_path, args.no_test_files, columns)
+
+# results of the tasks completed by previous runs
+journal_file = args.results_path + 'scheduler_journal.jsonl'
+results_file = evaluation.results_file(args.results_path)
+done = {}
+if os.path.exists(journal_file):
+    with open(journal_file) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # line cut short by a crash
+            done[record['task']] = record['score']
+
+# one experiment per feature subset and algorithm, with its sampled candidates
+graph = []
+for features in combos:
+    for ml, (model, param_dist, title) in experiments.ALGORITHMS.items():
+        candidates = list(ParameterSampler(param_dist, n_iter=experiments.N_ITER, random_state=args.seed))
+        graph.append({'features': features, 'ml': ml, 'candidates': candidates,
+                      'scores': [[None] * experiments.CV_FOLDS for c in candidates]})
+
+
+# tasks are only reused while the data sets they were computed on are unchanged
+version = experiments.data_version(args.data_path, args.no_test_files)
+
+
+def task_key(*parts):
+    return json.dumps((version,) + parts, default=int)
+
+
+executor = get_reusable_executor(max_workers=args.cores,
+                                 env={'OMP_NUM_THREADS': '1', 'OPENBLAS_NUM_THREADS': '1', 'MKL_NUM_THREADS': '1'})
+pending = {}
+
+
+def submit_final(exp):
+    # refit the best candidate of a completed experiment and evaluate it
+    means = [sum(scores) / len(scores) for scores in exp['scores']]
+    best = exp['candidates'][means.index(max(means))]
+    name = experiments.experiment_name(exp['features'])
+    print(f'{name} {exp["ml"]}: best params {best} ({max(means)})')
+    key = task_key('final', name, exp['ml'], best)
+    if key not in done:
+        future = executor.submit(experiments.final_task, *data, exp['features'], exp['ml'], best, args.results_path, args.compress)
+        pending[future] = (key, exp, None, None)
+
+
+def complete(exp):
+    return all(s is not None for scores in exp['scores'] for s in scores)
+
+
+# queue every fold task that has not completed yet
+for exp in graph:
+    name = experiments.experiment_name(exp['features'])
+    for c, params in enumerate(exp['candidates']):
+        for fold in range(experiments.CV_FOLDS):
+            key = task_key('cv', name, exp['ml'], params, fold)
+            if key in done:
+                exp['scores'][c][fold] = done[key]
+            else:
+                future = executor.submit(experiments.cv_task, *data, exp['features'], exp['ml'], params, fold)
+                pending[future] = (key, exp, c, fold)
+    if complete(exp):
+        submit_final(exp)
+
+total = len(pending)
+finished = 0
+with open(journal_file, 'a') as journal, timing.stage('tasks') as stage:
+    while pending:
+        completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in completed:
+            key, exp, c, fold = pending.pop(future)
+            score = future.result()
+            if c is None:
+                # evaluation results of a final task, saved to the results file of the run
+                evaluation.write_results(score, results_file)
+                results_store.save(score, args.results_path)
+                score = None
+            journal.write(json.dumps({'task': key, 'score': score}) + '\n')
+            journal.flush()
+            finished += 1
+            if c is not None:
+                exp['scores'][c][fold] = score
+                if complete(exp):
+                    submit_final(exp)
+                    total += 1
+        print(f'{finished}/{total} tasks completed')
+    stage['rows'] = finished
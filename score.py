@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Classifies a flow file of any size with a model saved by ML.py. The file is
+streamed in chunks; each chunk is standardized with the scaler.pkl of
+split_scale_data.py, reduced to the model's feature subset and predicted, and the
+flow key columns with the predicted class (and with --proba the probability of
+every class) are appended to savefile (csv, Parquet or Feather by extension) as
+soon as the chunk is done, so neither file is held in memory. Flows are expected
+to carry their BLINC counts, as written by engineered_features.py or pipeline.py;
+when they do not, the counts are accumulated over the whole file in a first pass.
+With --workers the chunks are predicted by that many processes while their
+results are still written in file order. The throughput in flows per second is
+reported as chunks are written. Tree models exported by export_trees.py (.npz)
+are refused, as they are only faster than scikit-learn on small batches.
+
+Usage: score.py flowfile model.joblib scaler.pkl savefile [--subset N] [--chunksize N]
+                [--workers N] [--proba] [--error E]
+'''
+
+import time
+import argparse
+from joblib import Parallel, delayed
+import storage
+import experiments
+import inference
+import feature_engineering_function
+import timing
+
+# flow columns copied to the predictions when the flow file has them
+KEY_COLUMNS = ['srcaddr', 'dstaddr', 'srcport', 'dstport', 'first', 'last']
+
+parser = argparse.ArgumentParser(usage='score.py flowfile model.joblib scaler.pkl savefile [--subset N] [--chunksize N] [--workers N] [--proba] [--error E]')
+parser.add_argument('file')
+parser.add_argument('model')
+parser.add_argument('scaler')
+parser.add_argument('savefile')
+parser.add_argument('--subset', type=int, default=None,
+                    help='feature subset of models saved without their features')
+parser.add_argument('--chunksize', type=int, default=1000000,
+                    help='number of flows read and predicted per chunk')
+parser.add_argument('--workers', type=int, default=1,
+                    help='number of processes predicting chunks')
+parser.add_argument('--proba', action='store_true',
+                    help='also write the probability of every class')
+parser.add_argument('--error', type=float, default=None,
+                    help='approximate missing BLINC counts with this relative standard error')
+args = parser.parse_args()
+if args.model.endswith('.npz'):
+    parser.error('flat tree exports are slower than scikit-learn on whole chunks, give the model.joblib they were exported from')
+timing.start()
+
+estimator, metadata = experiments.load_model(args.model)
+if 'features' in metadata:
+    features = metadata['features']
+elif args.subset is not None:
+    features = experiments.COMBINATIONS[args.subset][0]
+else:
+    parser.error('the model was saved without its features, give its --subset')
+
+start = time.perf_counter()
+columns = storage.table_columns(args.file)
+keep = [c for c in KEY_COLUMNS if c in columns]
+
+# BLINC counts over the whole file, for flow files without them
+blinc = [f for f in features if f in feature_engineering_function.BLINC_COLUMNS and f not in columns]
+if blinc:
+    usecols = ['srcaddr'] + list(feature_engineering_function.BLINC_SOURCES.values())
+    acc = None
+    with timing.stage('BLINC counts', 0) as stage:
+        for chunk in storage.iter_table(args.file, args.chunksize, columns=usecols):
+            acc = feature_engineering_function.BLINC_accumulate(chunk, acc, args.error)
+            stage['rows'] += len(chunk)
+        featuresdf = feature_engineering_function.BLINC_accumulated_counts(acc, args.error)
+    print(f'BLINC counts of {len(featuresdf)} source addresses computed')
+
+# columns read by the second pass
+read = keep + [f for f in features if f not in blinc] + (['srcaddr'] if blinc else [])
+
+
+def chunks():
+    for chunk in storage.iter_table(args.file, args.chunksize, columns=list(dict.fromkeys(read))):
+        if blinc:
+            chunk = feature_engineering_function.BLINC_attach(chunk, featuresdf)
+        yield chunk
+
+
+if args.workers > 1:
+    # every worker loads the model itself; results come back in chunk order, at
+    # most 2 * workers chunks in flight
+    del estimator
+    scored = Parallel(n_jobs=args.workers, return_as='generator')(
+        delayed(inference.score_chunk)(args.model, args.scaler, features, chunk, keep, args.proba)
+        for chunk in chunks())
+else:
+    classifier = inference.FlowClassifier(args.model, args.scaler, features, model=estimator)
+    scored = (classifier.score(chunk, keep, args.proba) for chunk in chunks())
+
+flows = 0
+with storage.TableWriter(args.savefile) as writer, timing.stage('score') as stage:
+    for df in scored:
+        writer.write(df)
+        flows += len(df)
+        stage['rows'] = flows
+        print(f'{flows} flows scored, {flows / (time.perf_counter() - start):.0f} flows/s', flush=True)
@@ -7,118 +7,140 @@ Created on Thu Jan 16 13:58:52 2020
 """
 
 '''
-Separates data into test and train sets in a 2:1 ratio (33% train, 67% test) using
-stratified sampling according to class label. Further subdivides test sets into 
+Separates data into test and train sets in a 2:1 ratio (67% train, 33% test) using
+stratified sampling according to class label. Further subdivides test sets into
 separate subsets maintaining the stratified sampling. Resulting train/test data sets
 are then standardized (0 mean, unit variance), with scaler object saved for future
 use if necessary. Finally, generates LaTeX table code where the number of data rows
-for each class are noted for each trian and test data sets.
-
-Usage: python3 split_scale_data.py #ofTests path/to/csv/with/classes/ path/to/save/new/files/ path/to/save/latex/table/and/scaler/object/
+for each class are noted for each trian and test data sets. The train/test sets are
+saved as csv by default, or as parquet/feather files if that format is given.
+
+The split is assigned once from the class column: every row gets the id of the
+set it belongs to (0 for train, i for test set i, -1 for rows without a class,
+which no set takes), and each set is then taken from the data in one step. With
+--chunksize the data file is streamed instead of loaded whole: a first pass
+accumulates the scaler's mean and variance over the train rows of every chunk
+(StandardScaler.partial_fit), and a second pass scales every chunk and writes its
+rows to their set's file, so neither the data nor the sets are held in memory.
+The streamed scaler matches the one fitted in memory to floating point
+precision, and streamed sets hold the same rows in file order.
+
+Usage: python3 split_scale_data.py #ofTests path/to/data/file path/to/save/new/files/ path/to/save/latex/table/and/scaler/object/ [format=csv] [--chunksize N]
 '''
+import argparse
+import contextlib
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from pickle import dump
-import sys
+import storage
+import timing
+
+parser = argparse.ArgumentParser(usage='python3 split_scale_data.py #ofTests path/to/data/file path/to/save/new/files/ path/to/save/latex/table/and/scaler/object/ [format=csv] [--chunksize N]')
+parser.add_argument('tests', type=int)
+parser.add_argument('file')
+parser.add_argument('save_path')
+parser.add_argument('tables_path')
+parser.add_argument('format', nargs='?', default='csv', choices=list(storage.FORMATS))
+parser.add_argument('--chunksize', type=int, default=None,
+                    help='stream the data file in chunks of this many flows')
+args = parser.parse_args()
+timing.start()
+
+NoOfTests = args.tests
+file = args.file                    # data file with class labels
+saveFilePath = args.save_path       # directory of the train/test data sets
+tables_path = args.tables_path      # directory of the LaTeX table and scaler object
+
+# Storage format of the train/test data sets
+extension = storage.FORMATS[args.format]
 
-if len(sys.argv) < 4:
-    print('Usage: python3 split_scale_data.py #ofTests path/to/csv/with/classes/ path/to/save/new/files/ path/to/save/latex/table/and/scaler/object/')
-    exit()
+# Columns to be scaled
+features = ['duration', 'dPkts', 'dOctets','dstaddrcount', 'srcportcount', 'dstportunique']
 
-NoOfTests = sys.argv[1]
-tables_path = sys.argv[2]
 
-# Provide file location for csv data file
-file = sys.argv[3]
+def set_file(s):
+    # data file of set s, 0 being the train set
+    return saveFilePath+('train' if s == 0 else 'test'+str(s))+'_scale'+extension
 
-# Provide file location for csv data file
-saveFilePath = sys.argv[4]
 
-# Columns to be scaled
-features = ['duration', 'dPkts', 'dOctets','dstaddrcount', 'srcportcount', 'dstportunique']
+def scaled(part, scaler):
+    # standardized features of a set's rows with their class labels
+    scaled = pd.DataFrame(data = scaler.transform(part[features]), columns = features)
+    scaled['class'] = part['class'].to_numpy()
+    return scaled
 
-df = pd.read_csv(file)     # Load csv
 
 ###############################################################################
 #                              TRAIN TEST SPLIT
 ###############################################################################
 
-# Dictionary of dataframes by class
-class_dict = dict(tuple(df.groupby(df['class'])))
-
-# create dataframes
-train = pd.DataFrame()
-
-test_dict ={}
-for t in range(1,NoOfTests + 1):
-    test_dict[t] = pd.DataFrame()
-
-for i in class_dict:        # iterate over all classes
-    print(i)
-    # split class df into train and test sets
-    train_temp, test_temp = train_test_split(class_dict[i], test_size=0.33, random_state=15)
-    # add to overall train df
-    train = train.append(train_temp)
-    # reset index
-    test_temp = test_temp.reset_index(drop=True)
-    # split test set into 6 subsets
-    for t in range(1,NoOfTests + 1):
-        test_dict[t] = test_dict[t].append(test_temp[test_temp.index % NoOfTests+1 == t])
+with timing.stage('load') as stage:
+    if args.chunksize is None:
+        df = storage.read_table(file)     # Load data file
+        labels = df['class']
+    else:
+        labels = storage.read_table(file, columns=['class'])['class']     # Load class labels only
+    stage['rows'] = len(labels)
+
+# set id of every row, and the rows of every set in the order they are taken
+with timing.stage('split', len(labels)):
+    split = np.full(len(labels), -1, dtype=np.int32)
+    order = [[] for s in range(NoOfTests + 1)]
+    for i, rows in sorted(labels.groupby(labels, observed=True).indices.items()):  # iterate over all classes
+        print(i)
+        # split class rows into train and test sets
+        train_rows, test_rows = train_test_split(rows, test_size=0.33, random_state=15)
+        split[train_rows] = 0
+        order[0].append(train_rows)
+        # split test rows into the test subsets, round robin
+        test_ids = np.arange(len(test_rows)) % NoOfTests + 1
+        split[test_rows] = test_ids
+        for t in range(1, NoOfTests + 1):
+            order[t].append(test_rows[test_ids == t])
+    order = [np.concatenate(rows) for rows in order]
 
 ###############################################################################
-#                                STANDARDIZE
+#                          STANDARDIZE AND SAVE DATA
 ###############################################################################
 
-labels = list(train['class']) # Save class labels as they are not to be standardized
-train = train[features]       # reduce df to only the pertinent feature columns
-
 scaler = StandardScaler()     # create scaler object
-df_scaled = scaler.fit_transform(train) # fit scaler object and scale the data
-
-# create df with scaled values
-train = pd.DataFrame(data = df_scaled, columns = features)
-train['class'] = labels       # add the class labels
-
-# standardize test dfs
-for i in range(1,NoOfTests + 1):
-    # Save class labels as they are not to be standardized
-    labels = list(test_dict[i]['class'])    
-    # reduce df to only the pertinent feature columns
-    test_dict[i] = test_dict[i][features]
-    
-    # scale the test subsets
-    temp = scaler.transform(test_dict[i])
-    # transform back into df
-    test_dict[i] = pd.DataFrame(data = temp, columns = features)
-    test_dict[i]['class'] = labels       # add the class labels
-
-# save the scaler
-dump(scaler, open(tables_path+'scaler.pkl', 'wb'))
 
-###############################################################################
-#                                  SAVE CSV
-###############################################################################
+if args.chunksize is None:
+    # fit scaler object on the train set and scale every set
+    with timing.stage('fit scaler', len(order[0])):
+        scaler.fit(df[features].take(order[0]))
+    with timing.stage('scale and write', len(labels)):
+        for s in range(NoOfTests + 1):
+            storage.write_table(scaled(df.take(order[s]), scaler), set_file(s))
+else:
+    # first pass: accumulate the mean and variance of the train rows chunk by chunk
+    with timing.stage('fit scaler', len(labels)):
+        for chunk in storage.iter_table(file, args.chunksize, columns=features):
+            train = chunk[split[chunk.index] == 0]
+            if len(train):
+                scaler.partial_fit(train)
+    # second pass: scale every chunk and append its rows to their set's file
+    with contextlib.ExitStack() as stack, timing.stage('scale and write', len(labels)):
+        writers = [stack.enter_context(storage.TableWriter(set_file(s))) for s in range(NoOfTests + 1)]
+        for chunk in storage.iter_table(file, args.chunksize, columns=features + ['class']):
+            ids = split[chunk.index]
+            for s, writer in enumerate(writers):
+                writer.write(scaled(chunk[ids == s], scaler))
 
-for i in range(1,NoOfTests + 1):
-    test_dict[i].to_csv(saveFilePath+'test'+str(i)+'_scale.csv',index=False)
-train.to_csv(saveFilePath+'train_scale.csv',index=False)
+# save the scaler
+with open(tables_path+'scaler.pkl', 'wb') as f:
+    dump(scaler, f)
 
 ###############################################################################
 #                              LATEX TABLE GENERATION
 ###############################################################################
 
-# save class labels
-index = df['class'].unique()
-index.sort()
-
-# create table df
-table = pd.DataFrame(index=index)
-        
-# load table df with data from all train and test sets
-table['Train'] = train.groupby('class').count()['dPkts']
-for i in range(1, NoOfTests+1):
-    table[i] = test_dict[i].groupby('class').count()['dPkts']
+# create table df with the number of rows of every class in every set
+labelled = split >= 0
+table = pd.crosstab(labels.to_numpy()[labelled], split[labelled])
+table.columns = ['Train'] + list(range(1, NoOfTests+1))
 
 # create latex table from table df
 head = '\\begin{table}[htpb]\n\centering\n\\resizebox{\\textwidth}{!}{%\n\\begin{tabular}{l'+'r'*(NoOfTests)+'r}\n\cline{2-'+str(NoOfTests+2)+'}\n'
@@ -135,7 +157,7 @@ for i, row in table.iterrows():
         line += f' & {row[t]}'
     line += ' \\\\ \hline\n'
     body += line
-    
+
 tail = '''\end{tabular}
 }
 \caption{Train and Test sets breakdown by class label}
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Reads and writes the flow data sets of every pipeline stage as csv, Parquet or
+Arrow IPC (Feather) files, chosen by file extension. The columnar formats keep
+column types, can load only the requested columns and are read memory-mapped;
+reading them in chunks decodes one batch of rows at a time.
+pyarrow is only needed for the columnar formats. Loaded data is converted to the
+compact column types of flow_schema.py; packed addresses are written back to csv
+files as dotted quads.
+'''
+
+import os
+import pandas as pd
+import flow_schema
+
+# file extension of each supported format, in the order they are looked up
+FORMATS = {'parquet': '.parquet', 'feather': '.feather', 'csv': '.csv'}
+EXTENSIONS = {'.parquet': 'parquet', '.pq': 'parquet',
+              '.feather': 'feather', '.arrow': 'feather', '.ipc': 'feather',
+              '.csv': 'csv'}
+# rows per Parquet row group, the unit a chunked read decodes at once
+ROW_GROUP_SIZE = 2**17
+
+
+def file_format(path):
+    """
+    Finds the storage format of a file from its extension.
+
+    Args:
+        path (str): data file path.
+
+    Returns:
+        fmt (str): 'csv', 'parquet' or 'feather'.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f"unknown data file format '{extension}' of {path}, expected one of {list(EXTENSIONS)}")
+    return EXTENSIONS[extension]
+
+
+def find_table(stem):
+    """
+    Finds the data file saved under a path without extension, preferring the
+    columnar formats.
+
+    Args:
+        stem (str): data file path without extension, e.g. 'data/train_scale'.
+
+    Returns:
+        path (str): path of the first existing data file.
+    """
+    for extension in FORMATS.values():
+        if os.path.exists(stem + extension):
+            return stem + extension
+    raise FileNotFoundError(f'no {"/".join(FORMATS)} data file found for {stem}')
+
+
+def read_table(path, columns = None, schema = True, scaled = False):
+    """
+    Loads a data file into a DataFrame.
+
+    Args:
+        path (str): data file path.
+        columns (list): columns to load. Default None loads all columns.
+        schema (bool): convert columns to the compact flow_schema types. Default True.
+        scaled (bool): the file holds standardized features, stored as float32. Default False.
+
+    Returns:
+        df (pandas.DataFrame): loaded data.
+    """
+    if file_format(path) == 'csv':
+        df = pd.read_csv(path, usecols=columns)
+    else:
+        df = _read_arrow(path, columns).to_pandas()
+    return flow_schema.apply_schema(df, scaled) if schema else df
+
+
+def iter_table(path, chunksize, columns = None, schema = True, scaled = False):
+    """
+    Reads a data file in chunks. Every chunk gets the same column types.
+
+    Args:
+        path (str): data file path.
+        chunksize (int): number of rows per chunk.
+        columns (list): columns to load. Default None loads all columns.
+        schema (bool): convert columns to the compact flow_schema types. Default True.
+        scaled (bool): the file holds standardized features, stored as float32. Default False.
+
+    Yields:
+        chunk (pandas.DataFrame): next chunk of rows, indexed by row number in the file.
+    """
+    if file_format(path) == 'csv':
+        chunks = pd.read_csv(path, usecols=columns, chunksize=chunksize)
+    else:
+        chunks = _iter_arrow(path, chunksize, columns)
+    for chunk in chunks:
+        yield flow_schema.apply_schema(chunk, scaled) if schema else chunk
+
+
+def table_columns(path):
+    """
+    Lists the columns of a data file from its header or schema, without reading
+    its rows.
+
+    Args:
+        path (str): data file path.
+
+    Returns:
+        columns (list): column names in file order.
+    """
+    fmt = file_format(path)
+    if fmt == 'csv':
+        return list(pd.read_csv(path, nrows=0).columns)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    import pyarrow as pa
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def write_table(df, path):
+    """
+    Saves a DataFrame to a data file without its index.
+
+    Args:
+        df (pandas.DataFrame): data to save.
+        path (str): data file path.
+    """
+    with TableWriter(path) as writer:
+        writer.write(df)
+
+
+class TableWriter:
+    """
+    Writes a data file incrementally, one DataFrame chunk at a time. The file is
+    written next to path and moved into place when the writer is closed, so path
+    may be the file that is being read. Use as a context manager.
+
+    Args:
+        path (str): data file path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmpfile = path + '.tmp'
+        self.format = file_format(path)
+        self.writer = None
+        self.schema = None
+        self.categories = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+
+    def write(self, df):
+        """
+        Appends the rows of df to the file.
+
+        Args:
+            df (pandas.DataFrame): rows to append, with the same columns for every call.
+        """
+        if self.format == 'csv':
+            packed = flow_schema.ipv4_columns(df)
+            if packed:
+                df = df.assign(**{c: flow_schema.unpack_ipv4(df[c]) for c in packed})
+            if self.writer is None:
+                self.writer = open(self.tmpfile, 'w', newline='')
+                df.to_csv(self.writer, index=False)
+            else:
+                df.to_csv(self.writer, header=False, index=False)
+            return
+
+        import pyarrow as pa
+        table = pa.Table.from_pandas(self._extend_categories(df), schema=self.schema, preserve_index=False)
+        if self.writer is None:
+            self.schema = table.schema
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                self.writer = pq.ParquetWriter(self.tmpfile, self.schema)
+            else:
+                # uncompressed so that reads can map the file without decoding it
+                options = pa.ipc.IpcWriteOptions(compression=None, emit_dictionary_deltas=True)
+                self.writer = pa.ipc.new_file(self.tmpfile, self.schema, options=options)
+        if self.format == 'parquet':
+            self.writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+        else:
+            self.writer.write_table(table)
+
+    def _extend_categories(self, df):
+        # categories only ever grow across chunks, so the dictionary of each chunk
+        # extends the one of the previous chunk as the IPC file format requires
+        for column in df.columns[[isinstance(t, pd.CategoricalDtype) for t in df.dtypes]]:
+            seen = self.categories.get(column, pd.Index([]))
+            categories = seen.append(df[column].cat.categories.difference(seen))
+            if not categories.equals(df[column].cat.categories):
+                df = df.assign(**{column: df[column].cat.set_categories(categories)})
+            self.categories[column] = categories
+        return df
+
+    def close(self, commit = True):
+        """
+        Finishes the file and moves it into place, or discards it if commit is False.
+
+        Args:
+            commit (bool): keep the written file. Default True.
+        """
+        if self.writer is not None:
+            self.writer.close()
+        if commit and self.writer is not None:
+            os.replace(self.tmpfile, self.path)
+        elif os.path.exists(self.tmpfile):
+            os.remove(self.tmpfile)
+        self.writer = None
+
+
+def _iter_arrow(path, chunksize, columns):
+    # chunks of a columnar data file, indexed by row number in the file; only one
+    # batch of rows is decoded at a time
+    start = 0
+    for batch in _arrow_batches(path, chunksize, columns):
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def _arrow_batches(path, chunksize, columns):
+    # record batches of at most chunksize rows of a columnar data file
+    if file_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+        # without pre-buffering only the column chunks of the current batch are read
+        yield from pq.ParquetFile(path, pre_buffer=False).iter_batches(batch_size=chunksize, columns=columns)
+        return
+    import pyarrow as pa
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            # the file is mapped, so slicing a large batch does not read it whole
+            for offset in range(0, batch.num_rows, chunksize):
+                yield batch.slice(offset, chunksize)
+
+
+def _read_arrow(path, columns):
+    # memory-mapped read of a columnar data file into an arrow table
+    if file_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns, memory_map=True)
+    import pyarrow as pa
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns is not None else table
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Generates synthetic NetFlow records with the same columns as the nDPI labelled
+flow exports, used by the benchmark scripts to time the pipeline at volumes
+larger than the captured data sets.
+'''
+
+import pandas as pd
+import numpy as np
+
+# nDPI application labels drawn for the synthetic flows
+APPS = ['SSL', 'DNS', 'HTTP', 'Google', 'YouTube', 'NTP', 'SSH', 'QUIC',
+        'Microsoft', 'BitTorrent', 'SNMP', 'unknown']
+
+
+def ip_pool(size, rng):
+    """
+    Creates a pool of distinct dotted quad IPv4 address strings.
+
+    Args:
+        size (int): number of addresses in the pool.
+        rng (numpy.random.Generator): random generator.
+
+    Returns:
+        pool (numpy.ndarray): object array of address strings.
+    """
+    packed = rng.choice(2**32 - 2**24, size=size, replace=False) + 2**24
+    octets = [(packed >> shift) & 255 for shift in (24, 16, 8, 0)]
+    return np.array(['.'.join(map(str, ip)) for ip in zip(*octets)], dtype=object)
+
+
+def synthetic_flows(nrows, nsources = None, ndestinations = None, seed = 0, start = 0):
+    """
+    Generates synthetic flow records. Source activity is heavy tailed so a few
+    hosts own most of the flows, as in the captured traffic.
+
+    Args:
+        nrows (int): number of flows.
+        nsources (int): number of distinct source addresses. Default nrows // 100.
+        ndestinations (int): number of distinct destination addresses. Default nrows // 10.
+        seed (int): random seed. Default 0.
+        start (int): timestamp in milliseconds of the first flow. Default 0.
+
+    Returns:
+        df (pandas.DataFrame): synthetic flow records sorted by flow start time.
+    """
+    rng = np.random.default_rng(seed)
+    nsources = nsources or max(nrows // 100, 1)
+    ndestinations = ndestinations or max(nrows // 10, 1)
+
+    src_pool = ip_pool(nsources, rng)
+    dst_pool = ip_pool(ndestinations, rng)
+    src = np.minimum(rng.zipf(1.3, nrows) - 1, nsources - 1)
+    dst = rng.integers(0, ndestinations, nrows)
+
+    first = start + np.sort(rng.integers(0, max(nrows, 1000), nrows))
+    duration = rng.exponential(2000, nrows).astype(np.int64)
+    dPkts = rng.geometric(0.05, nrows)
+    return pd.DataFrame({'srcaddr': src_pool[src],
+                         'dstaddr': dst_pool[dst],
+                         'srcport': rng.integers(1024, 65536, nrows),
+                         'dstport': rng.choice([53, 80, 123, 443, 22, 8080], nrows),
+                         'first': first,
+                         'last': first + duration,
+                         'duration': duration,
+                         'dPkts': dPkts,
+                         'dOctets': dPkts * rng.integers(40, 1500, nrows),
+                         'app': rng.choice(APPS, nrows)})
@@ -0,0 +1,58 @@
+'''
+Checks the windowed BLINC counts of a live flow feed against counts recomputed
+from scratch over the flows of each window, and that the approximate window
+stays within its error.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+from feature_engineering_function import BLINC_COLUMNS, BLINC_SOURCES, BLINCWindow
+from synthetic_flows import synthetic_flows
+
+
+@pytest.fixture(scope='module')
+def flows():
+    return synthetic_flows(5000, seed=2).sort_values('first', ignore_index=True)
+
+
+def batches(flows, seed = 0):
+    # (start, end) rows of batches of random size
+    bounds = np.cumsum(np.random.default_rng(seed).integers(1, 200, len(flows)))
+    bounds = np.concatenate([[0], bounds[bounds < len(flows)], [len(flows)]])
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def feed(window, flows):
+    # update the window batch by batch, returning the counted flows
+    return pd.concat([window.update(flows.iloc[start:end]) for start, end in batches(flows)])
+
+
+def recount(flows, size, step):
+    # distinct counts per flow over the flows of its source that arrived up to
+    # its batch, in the panes of its window
+    pane = flows['first'] // step
+    counts = []
+    for start, end in batches(flows):
+        arrived = flows.iloc[:end]
+        for row in range(start, end):
+            p = pane.iloc[row]
+            seen = arrived[(pane.iloc[:end] <= p) & (pane.iloc[:end] > p - size // step)
+                           & (arrived['srcaddr'] == flows['srcaddr'].iloc[row])]
+            counts.append([seen[column].nunique() for column in BLINC_SOURCES.values()])
+    return pd.DataFrame(counts, columns=BLINC_COLUMNS)
+
+
+@pytest.mark.parametrize('size, step', [(600, 600), (600, 200)])
+def test_exact_window(flows, size, step):
+    sample = flows.iloc[:1500]
+    counted = feed(BLINCWindow(size, step), sample)
+    expected = recount(sample, size, step)
+    pd.testing.assert_frame_equal(counted[BLINC_COLUMNS].reset_index(drop=True), expected, check_dtype=False)
+
+
+def test_approximate_window(flows):
+    exact = feed(BLINCWindow(600, 200), flows)[BLINC_COLUMNS]
+    approx = feed(BLINCWindow(600, 200, error=0.05), flows)[BLINC_COLUMNS]
+    relative = (approx - exact) / exact
+    assert ((relative**2).mean()**.5 <= 0.05).all()
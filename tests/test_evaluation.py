@@ -0,0 +1,57 @@
+'''
+Checks the confusion matrices and reports of evaluation.evaluate against
+scikit-learn's confusion_matrix and classification_report, for test sets where
+a label is missing from the true classes, or from both true and predicted classes.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import classification_report, confusion_matrix
+import evaluation
+
+LABELS = ['DNS', 'HTTP', 'SSH', 'SSL']
+
+
+class Lookup:
+    # classifier predicting the label stored in the pred column of each row
+    classes_ = np.array(LABELS)
+
+    def predict(self, X):
+        return X['pred'].to_numpy()
+
+
+@pytest.fixture(scope='module')
+def test_dict():
+    rng = np.random.default_rng(4)
+
+    def test_set(true_labels, predicted_labels, size):
+        true = rng.choice(true_labels, size)
+        # mostly right, otherwise one of predicted_labels
+        pred = np.where(rng.random(size) < .7, true, rng.choice(predicted_labels, size))
+        return pd.DataFrame({'pred': pred, 'class': true})
+
+    return {1: test_set(LABELS, LABELS, 500),
+            # SSH is predicted but never true
+            2: test_set(['DNS', 'HTTP', 'SSL'], LABELS, 300),
+            # DNS is neither true nor predicted
+            3: test_set(['HTTP', 'SSH', 'SSL'], ['HTTP', 'SSH', 'SSL'], 200)}
+
+
+def test_against_sklearn(test_dict):
+    results = evaluation.evaluate(Lookup(), test_dict, ['pred'])
+    assert [r['test'] for r in results] == list(test_dict)
+    assert 'SSH' not in set(test_dict[2]['class'])
+    assert 'DNS' not in set(test_dict[3]['class']) | set(test_dict[3]['pred'])
+
+    for r in results:
+        y_true, y_pred = test_dict[r['test']]['class'], test_dict[r['test']]['pred']
+        assert r['labels'] == LABELS
+        np.testing.assert_array_equal(r['confusion_matrix'], confusion_matrix(y_true, y_pred, labels=LABELS))
+
+        expected = classification_report(y_true, y_pred, output_dict=True, zero_division=0)
+        assert r['report'].keys() == expected.keys()
+        assert r['accuracy'] == pytest.approx(expected['accuracy'])
+        for key, scores in expected.items():
+            if key != 'accuracy':
+                assert r['report'][key] == pytest.approx(scores), key
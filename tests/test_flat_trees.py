@@ -0,0 +1,38 @@
+'''
+Checks that the flat node arrays of flat_trees.py predict exactly what the
+scikit-learn decision tree and random forest they were exported from predict,
+including for rows with missing values, and after a save and load.
+'''
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+from flat_trees import FlatTrees
+
+
+@pytest.fixture(scope='module')
+def data():
+    X, y = make_classification(6000, n_features=6, n_informative=4, n_classes=4, random_state=0)
+    # missing values in training, so the trees learn which side they go to
+    X[np.random.default_rng(0).random(X.shape) < .1] = np.nan
+    return X[:4000], y[:4000], X[4000:]
+
+
+@pytest.mark.parametrize('model', [DecisionTreeClassifier(min_samples_leaf=3, random_state=0),
+                                   RandomForestClassifier(20, min_samples_leaf=3, random_state=0)],
+                         ids=['dt', 'rf'])
+def test_flat_predictions(data, model, tmp_path):
+    X_train, y_train, X = data
+    model.fit(X_train, y_train)
+    flat = FlatTrees.from_estimator(model)
+    flat.save(tmp_path / 'model.npz')
+    loaded = FlatTrees.load(tmp_path / 'model.npz')
+
+    assert np.isnan(X).any()
+    for trees in flat, loaded:
+        np.testing.assert_array_equal(trees.predict_proba(X), model.predict_proba(X))
+        np.testing.assert_array_equal(trees.predict(X), model.predict(X))
+        # single rows take the same path as batches
+        np.testing.assert_array_equal(trees.predict(X[:1]), model.predict(X[:1]))
@@ -0,0 +1,66 @@
+'''
+Checks the approximate (HyperLogLog) BLINC counts against the exact counts on
+synthetic flows, and that sketches merged across chunks and worker processes
+give the same estimates as one sketch over all flows.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+import feature_engineering_function
+from feature_engineering_function import BLINC_COLUMNS
+from synthetic_flows import synthetic_flows
+
+
+@pytest.fixture(scope='module')
+def flows():
+    return synthetic_flows(100000, seed=1)
+
+
+@pytest.fixture(scope='module')
+def exact(flows):
+    return feature_engineering_function.BLINC_features(flows)
+
+
+def per_source(df):
+    # one row of counts per source address, the unit a sketch estimates
+    return df.drop_duplicates('srcaddr').set_index('srcaddr')[BLINC_COLUMNS]
+
+
+@pytest.mark.parametrize('error', [0.02, 0.05, 0.1])
+def test_relative_error(flows, exact, error):
+    approx = per_source(feature_engineering_function.BLINC_features(flows, error=error))
+    expected = per_source(exact)
+    relative = (approx - expected) / expected
+    rms = (relative**2).mean()**.5
+    for column in BLINC_COLUMNS:
+        assert rms[column] <= error, column
+
+
+def test_chunk_merge(flows):
+    error = 0.05
+    whole = feature_engineering_function.BLINC_accumulated_counts(
+        feature_engineering_function.BLINC_accumulate(flows, error=error), error)
+
+    # one accumulator fed chunk by chunk
+    acc = None
+    for chunk in np.array_split(np.arange(len(flows)), 7):
+        acc = feature_engineering_function.BLINC_accumulate(flows.iloc[chunk], acc, error)
+    chunked = feature_engineering_function.BLINC_accumulated_counts(acc, error)
+
+    # separate accumulators combined afterwards
+    accs = [feature_engineering_function.BLINC_accumulate(flows.iloc[chunk], error=error)
+            for chunk in np.array_split(np.arange(len(flows)), 3)]
+    combined = feature_engineering_function.BLINC_accumulated_counts(
+        feature_engineering_function.BLINC_combine(accs, error), error)
+
+    pd.testing.assert_frame_equal(chunked.sort_index(), whole.sort_index())
+    pd.testing.assert_frame_equal(combined.sort_index(), whole.sort_index())
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_parallel_merge(flows, workers):
+    error = 0.05
+    serial = feature_engineering_function.BLINC_features(flows, error=error)
+    parallel = feature_engineering_function.BLINC_features_parallel(flows, workers, error=error)
+    pd.testing.assert_frame_equal(parallel[BLINC_COLUMNS], serial[BLINC_COLUMNS])
@@ -0,0 +1,60 @@
+'''
+Checks that split_scale_data.py streaming the data file in chunks fits the same
+scaler and writes the same train and test sets as loading it whole, including
+for rows without a class.
+'''
+
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO = Path(__file__).resolve().parents[1]
+FEATURES = ['duration', 'dPkts', 'dOctets', 'dstaddrcount', 'srcportcount', 'dstportunique']
+TESTS = 3
+
+
+@pytest.fixture(scope='module')
+def data_file(tmp_path_factory):
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame(rng.lognormal(3, 2, (2000, len(FEATURES))).round(), columns=FEATURES)
+    df['class'] = rng.choice(['Web', 'DNS', 'p2p_traffic', 'mail'], len(df), p=[.5, .3, .15, .05])
+    df.loc[rng.random(len(df)) < .05, 'class'] = np.nan
+    path = tmp_path_factory.mktemp('data') / 'flows.csv'
+    df.to_csv(path, index=False)
+    return path
+
+
+def split_scale(data_file, directory, *options):
+    # run split_scale_data.py into directory, returning its scaler and sets
+    directory.mkdir()
+    subprocess.run([sys.executable, 'split_scale_data.py', str(TESTS), str(data_file),
+                    f'{directory}/', f'{directory}/', *options],
+                   cwd=REPO, check=True, capture_output=True)
+    with open(directory / 'scaler.pkl', 'rb') as f:
+        scaler = pickle.load(f)
+    sets = [pd.read_csv(directory / f'{name}_scale.csv')
+            for name in ['train'] + [f'test{t}' for t in range(1, TESTS + 1)]]
+    return scaler, sets
+
+
+def sorted_rows(df):
+    return df.sort_values(list(df.columns), ignore_index=True)
+
+
+def test_streamed_matches_in_memory(data_file, tmp_path):
+    scaler, sets = split_scale(data_file, tmp_path / 'memory')
+    streamed_scaler, streamed_sets = split_scale(data_file, tmp_path / 'streamed', '--chunksize', '300')
+
+    np.testing.assert_allclose(streamed_scaler.mean_, scaler.mean_, rtol=1e-12)
+    np.testing.assert_allclose(streamed_scaler.var_, scaler.var_, rtol=1e-12)
+    assert streamed_scaler.n_samples_seen_ == scaler.n_samples_seen_
+
+    labelled = pd.read_csv(data_file)['class'].notna().sum()
+    assert sum(len(s) for s in sets) == labelled
+    for expected, streamed in zip(sets, streamed_sets):
+        assert streamed['class'].notna().all()
+        pd.testing.assert_frame_equal(sorted_rows(streamed), sorted_rows(expected), rtol=1e-12)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Timing instrumentation of the pipeline scripts. A script calls start() once and
+wraps its stages (loading, feature engineering, splitting, scaling, fitting,
+prediction, writing) in stage(), which measures the wall time of the stage and
+the peak resident memory of the process, and of its finished child processes,
+so far. When the script exits, one JSON line per stage (run, script, stage, rows,
+seconds, rows per second, peak memory, and the exception of a failed stage) and
+one for the whole run are appended to the timing report: timing_report.jsonl in
+the working directory, or the file given by the TIMING_REPORT environment
+variable (an empty value disables the report). With the TIMING_PROFILE
+environment variable set to a directory, the run is also profiled with cProfile
+and its statistics are saved there as <script>_<run>.prof, to be read with pstats.
+'''
+
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import resource
+import contextlib
+
+# default timing report, in the working directory
+REPORT_FILE = 'timing_report.jsonl'
+
+# stages of the running script, and the run they belong to
+_stages = []
+_run = {}
+
+
+def peak_rss():
+    """
+    Gives the peak resident memory of this process and of its finished child
+    processes.
+
+    Returns:
+        peak (float): peak resident memory of this process in MB.
+        children (float): largest peak resident memory of a child process in MB.
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 2**20 if sys.platform == 'darwin' else 2**10
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit)
+
+
+def start(script = None):
+    """
+    Starts timing a run of a script: the timing report is written when the
+    script exits, and the run is profiled if TIMING_PROFILE is set.
+
+    Args:
+        script (str): script name. Default None, the name of the running script.
+    """
+    if _run:
+        return
+    _run.update(run=time.strftime('%Y%m%d-%H%M%S')+'-'+str(os.getpid()),
+                script=script or os.path.basename(sys.argv[0]), start=time.perf_counter())
+    if os.environ.get('TIMING_PROFILE'):
+        _run['profiler'] = cProfile.Profile()
+        _run['profiler'].enable()
+    atexit.register(_finish)
+
+
+@contextlib.contextmanager
+def stage(name, rows = None):
+    """
+    Times a stage of the running script. The number of rows the stage processed
+    can be given up front or set on the yielded record once it is known.
+
+    Args:
+        name (str): stage name.
+        rows (int): rows processed by the stage. Default None.
+
+    Yields:
+        record (dict): timing record of the stage, whose 'rows' may be set.
+    """
+    record = {'stage': name, 'rows': rows, 'error': None}
+    begin = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        _stages.append(_measure(record, time.perf_counter() - begin))
+
+
+def report():
+    """
+    Gives the timing records of the stages run so far.
+
+    Returns:
+        records (list): one dict per stage with its stage, rows, error (the
+            exception that ended the stage, None if it completed), seconds,
+            rows_per_s, peak_rss_mb and children_peak_rss_mb.
+    """
+    return list(_stages)
+
+
+def _measure(record, seconds):
+    # completes a timing record with its time, throughput and memory
+    rows = record['rows']
+    peak, children = peak_rss()
+    record.update(rows=None if rows is None else int(rows), seconds=seconds,
+                  rows_per_s=rows / seconds if rows and seconds > 0 else None,
+                  peak_rss_mb=peak, children_peak_rss_mb=children)
+    return record
+
+
+def _finish():
+    # writes the timing report and the profile of the run at exit
+    total = _measure({'stage': 'total', 'rows': None, 'error': None}, time.perf_counter() - _run['start'])
+    path = os.environ.get('TIMING_REPORT', REPORT_FILE)
+    if path:
+        with open(path, 'a') as f:
+            for record in _stages + [total]:
+                f.write(json.dumps({'run': _run['run'], 'script': _run['script'], **record}) + '\n')
+    if 'profiler' in _run:
+        _run['profiler'].disable()
+        directory = os.environ['TIMING_PROFILE']
+        os.makedirs(directory, exist_ok=True)
+        _run['profiler'].dump_stats(os.path.join(directory, _run['script'].rsplit('.', 1)[0]+'_'+_run['run']+'.prof'))